@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from app.core.config import get_settings
+from app.observability.profiling import profile_arm, token_matches
+
+
+def require_profile_token(x_profile_token: str | None = Header(default=None)) -> None:
+    if not token_matches(x_profile_token, get_settings().profile_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_profile_token)])
+
+
+@router.post("/profile")
+def arm_profiler(requests: int = Query(default=1, ge=0, le=1000)):
+    # Profiles the next N requests that run a tracked endpoint (/plan); 0 disarms
+    return {"armed": profile_arm.arm(requests)}
+
+
+@router.get("/profile")
+def list_profiles(limit: int = Query(default=20, ge=1, le=500)):
+    out_dir = get_settings().profile_dir
+    files = sorted(out_dir.glob("*.folded"), key=lambda f: f.stat().st_mtime, reverse=True)[:limit] if out_dir.exists() else []
+    return {"armed": profile_arm.remaining, "profiles": [f.name for f in files]}
+
+
+@router.get("/profile/{profile_id}")
+def get_profile(profile_id: str):
+    path = get_settings().profile_dir / profile_id
+    if "/" in profile_id or "\\" in profile_id or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"profile_id": profile_id, "folded": path.read_text(encoding="utf-8")}
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Header, HTTPException, Request
+
+from app.core.config import get_settings
+from app.core.deadline import set_deadline
+
+
+class AdmissionController:
+    """
+    Bounds concurrent work on an endpoint.
+
+    At most `max_inflight` requests run at once; up to `max_queue` more wait for
+    a slot. Anything beyond that is shed immediately, and a queued request
+    that can't get a slot before its deadline is shed too.
+    """
+
+    def __init__(self, *, max_inflight: int, max_queue: int):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self._sem = asyncio.Semaphore(self.max_inflight)
+        # asyncio primitives bind to the loop that first waits on them
+        try:
+            self.loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self.inflight = 0
+        self.queued = 0
+        self.shed = 0
+
+    async def acquire(self, timeout_s: float) -> bool:
+        if self._sem.locked() and self.queued >= self.max_queue:
+            self.shed += 1
+            return False
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=max(0.0, timeout_s))
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.queued -= 1
+
+        self.inflight += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._sem.release()
+
+
+def new_plan_admission() -> AdmissionController:
+    settings = get_settings()
+    return AdmissionController(max_inflight=settings.plan_max_inflight, max_queue=settings.plan_max_queue)
+
+
+def get_plan_admission(app: FastAPI) -> AdmissionController:
+    """
+    The app's controller. main.py creates it on startup, so each app (and the
+    event loop serving it) gets its own semaphore; transports that skip the
+    lifespan (e.g. httpx.ASGITransport) get one created on first use, and a
+    new one if the app is later served from another loop.
+    """
+    controller = getattr(app.state, "plan_admission", None)
+    if controller is None or controller.loop is not asyncio.get_running_loop():
+        controller = app.state.plan_admission = new_plan_admission()
+    return controller
+
+
+def _overloaded(detail: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+
+async def plan_admission(
+    request: Request,
+    x_deadline_ms: int | None = Header(default=None, ge=1),
+) -> AsyncIterator[float]:
+    """
+    Dependency for /plan: admits the request and sets its deadline.
+
+    The deadline comes from the X-Deadline-Ms header (relative, capped at
+    PLAN_MAX_DEADLINE_S) or PLAN_DEFAULT_DEADLINE_S. It also bounds time spent
+    queued, and retrieval, embedding and tool calls read it via app.core.deadline.
+    """
+    settings = get_settings()
+    budget_s = settings.plan_default_deadline_s if x_deadline_ms is None else x_deadline_ms / 1000.0
+    budget_s = min(budget_s, settings.plan_max_deadline_s)
+
+    deadline = set_deadline(budget_s)
+    controller = get_plan_admission(request.app)
+    if not await controller.acquire(timeout_s=budget_s):
+        raise _overloaded("Server busy: planning capacity exhausted, retry shortly")
+
+    try:
+        yield deadline
+    finally:
+        controller.release()
@@ -1,7 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from datetime import datetime, timezone
+from typing import Tuple
 
+from app.api.admission import plan_admission
+from app.observability.profiling import track_threads
+from app.rag.packs import pack_sources
 from app.schemas.trip import TripRequest
 from app.schemas.itinerary import ItineraryResponse, TripSummary, DayPlan, ScheduleItem
 from app.schemas.tool_results import ToolResultEnvelope, WeatherResult
@@ -16,16 +20,22 @@ def health():
 def root():
     return {"message": "Travel Buddy API is running"}
 
-@router.post("/plan", response_model=ItineraryResponse)
-def plan_trip(req: TripRequest) -> ItineraryResponse:
-    # Temporary “mock” response to prove schemas work end-to-end
+def _weather_for(req: TripRequest) -> Tuple[ToolResultEnvelope, WeatherResult]:
+    # Mock weather provider; the real one will call the forecast API for the trip's dates
     weather_env = ToolResultEnvelope(
         status="ok",
         provider="mock",
         retrieved_at_utc=datetime.now(timezone.utc),
         cache_hit=True,
     )
-    weather_data = WeatherResult(summary="Warm with possible showers", high_c=31, low_c=26)
+    return weather_env, WeatherResult(summary="Warm with possible showers", high_c=31, low_c=26)
+
+
+@router.post("/plan", response_model=ItineraryResponse, dependencies=[Depends(plan_admission)])
+@track_threads
+def plan_trip(req: TripRequest) -> ItineraryResponse:
+    # Temporary “mock” response to prove schemas work end-to-end
+    weather_env, weather_data = _weather_for(req)
 
     summary = TripSummary(
         destination=req.destination,
@@ -49,5 +59,6 @@ def plan_trip(req: TripRequest) -> ItineraryResponse:
         trip_summary=summary,
         days=[day1],
         practical_notes=["This is a schema test response. Real agents will fill this later."],
-        sources=[],
+        # Precomputed at ingest; no query embedding or vector search needed
+        sources=pack_sources(req.destination),
     )
\ No newline at end of file
@@ -1,7 +1,10 @@
 # app/core/config.py
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -26,9 +29,24 @@ class Settings(BaseSettings):
     gemini_model: str = Field(default="gemini-2.0-flash", alias="GEMINI_MODEL")
     gemini_embed_model: str = Field(default="gemini-embedding-001", alias="GEMINI_EMBED_MODEL")
 
-    # RAG / Chroma
+    # RAG / vector index ("numpy" = mmap'd flat matrix under chroma_dir, shared across workers)
+    index_backend: Literal["chroma", "numpy"] = Field(default="chroma", alias="INDEX_BACKEND")
+    # int8 shrinks the coarse matrix 4x but searches ~2x slower (no BLAS int8 matmul in numpy)
+    numpy_index_dtype: Literal["float32", "int8"] = Field(default="float32", alias="NUMPY_INDEX_DTYPE")
+    index_batch_size: int = Field(default=256, alias="INDEX_BATCH_SIZE")
+    # Ingest builds a new snapshot under chroma_dir/snapshots and publishes it by
+    # swapping chroma_dir/CURRENT; workers pick it up on their next retrieval
+    index_snapshots: bool = Field(default=True, alias="INDEX_SNAPSHOTS")
+    snapshot_keep: int = Field(default=2, alias="SNAPSHOT_KEEP")
+    # Per-destination knowledge packs built at ingest (0 = don't build)
+    pack_chunks_per_section: int = Field(default=3, alias="PACK_CHUNKS_PER_SECTION")
     chroma_dir: Path = Field(default=BASE_DIR / "data" / "chroma", alias="CHROMA_DIR")
     chroma_collection: str = Field(default="wikivoyage_chunks", alias="CHROMA_COLLECTION")
+    embed_dim: int = Field(default=768, alias="EMBED_DIM")
+    # Matryoshka first pass (numpy backend): truncated copy searched wide, then
+    # rescored at embed_dim (0 = off). Chroma always searches full vectors in one pass.
+    coarse_dim: int = Field(default=256, alias="COARSE_DIM")
+    coarse_candidates_factor: int = Field(default=8, alias="COARSE_CANDIDATES_FACTOR")
 
     # Weather
     openweather_api_key: str | None = Field(default=None, alias="OPENWEATHER_API_KEY")
@@ -44,10 +62,39 @@ class Settings(BaseSettings):
     enable_metrics: bool = Field(default=True, alias="ENABLE_METRICS")
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
 
+    # Admission control for /plan
+    plan_max_inflight: int = Field(default=8, alias="PLAN_MAX_INFLIGHT")
+    plan_max_queue: int = Field(default=16, alias="PLAN_MAX_QUEUE")
+    plan_default_deadline_s: float = Field(default=30.0, alias="PLAN_DEFAULT_DEADLINE_S")
+    plan_max_deadline_s: float = Field(default=120.0, alias="PLAN_MAX_DEADLINE_S")
+
+    # Profiling (off by default; when off no middleware or admin routes are installed).
+    # Requires PROFILE_TOKEN: sent as X-Profile-Token to profile a request or use /admin/profile.
+    profiling_enabled: bool = Field(default=False, alias="PROFILING_ENABLED")
+    profile_token: str | None = Field(default=None, alias="PROFILE_TOKEN")
+    profile_dir: Path = Field(default=BASE_DIR / "data" / "profiles", alias="PROFILE_DIR")
+    profile_interval_ms: float = Field(default=5.0, alias="PROFILE_INTERVAL_MS")
+    profile_keep: int = Field(default=50, alias="PROFILE_KEEP")
+
     @property
     def effective_api_key(self) -> str | None:
         # If both exist, GOOGLE_API_KEY takes precedence in Google SDKs :contentReference[oaicite:3]{index=3}
         return self.google_api_key or self.gemini_api_key
 
+    @property
+    def effective_coarse_dim(self) -> int:
+        # A "coarse" pass at or above full dimension would just duplicate the index
+        return self.coarse_dim if 0 < self.coarse_dim < self.embed_dim else 0
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    # Built on first use, not at import, so CLIs like `--help` never read .env
+    return Settings()
+
 
-settings = Settings()
+def __getattr__(name: str) -> Any:
+    # Keeps `from app.core.config import settings` working (PEP 562)
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
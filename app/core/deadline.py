@@ -0,0 +1,45 @@
+# app/core/deadline.py
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Absolute time.monotonic() value after which work for the current request is wasted.
+# A ContextVar follows the request into FastAPI's threadpool and into asyncio tasks.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a request's deadline passes before a stage could start or finish."""
+
+
+def set_deadline(seconds_from_now: float) -> float:
+    deadline = time.monotonic() + seconds_from_now
+    _deadline.set(deadline)
+    return deadline
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+def timeout_for(default_s: float) -> float:
+    """
+    Per-call timeout for a tool/HTTP call made while serving a request: the
+    default, capped by what the request has left. Outside a request (ingest
+    CLIs) no deadline is set and the default is returned unchanged.
+    """
+    check_deadline("tool call")
+    left = remaining()
+    return default_s if left is None else min(default_s, left)
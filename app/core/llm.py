@@ -2,12 +2,20 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from app.core.config import settings
+from typing import TYPE_CHECKING
+
+from app.core.config import get_settings
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 
 
 @lru_cache(maxsize=1)
 def get_chat_model() -> ChatGoogleGenerativeAI:
+    # langchain pulls in a large dependency tree; import on first use only
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    settings = get_settings()
     # LangChain: set GOOGLE_API_KEY env var (recommended) or pass api_key param :contentReference[oaicite:4]{index=4}
     return ChatGoogleGenerativeAI(
         model=settings.gemini_model,
@@ -18,6 +26,9 @@ def get_chat_model() -> ChatGoogleGenerativeAI:
 
 @lru_cache(maxsize=1)
 def get_embedder() -> GoogleGenerativeAIEmbeddings:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    settings = get_settings()
     # LangChain embeddings: set GOOGLE_API_KEY env var or pass google_api_key kwarg :contentReference[oaicite:5]{index=5}
     return GoogleGenerativeAIEmbeddings(
         model=settings.gemini_embed_model,
@@ -1,5 +1,42 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api.admission import new_plan_admission
 from app.api.routes import router
+from app.core.config import get_settings
+from app.core.deadline import DeadlineExceeded
+
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Per-app admission state, created on the event loop that will use it
+    app.state.plan_admission = new_plan_admission()
+    yield
+
 
-app = FastAPI(title="Travel Buddy API")
+app = FastAPI(title="Travel Buddy API", lifespan=lifespan)
 app.include_router(router)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    # Work was abandoned at a stage boundary instead of finishing for nobody
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+if settings.profiling_enabled and not settings.profile_token:
+    print("[WARN] PROFILING_ENABLED is set but PROFILE_TOKEN is not; profiling stays off")
+elif settings.profiling_enabled:
+    from app.api.admin import router as admin_router
+    from app.observability.profiling import install_profiling
+
+    app.include_router(admin_router)
+    install_profiling(
+        app,
+        out_dir=settings.profile_dir,
+        interval_ms=settings.profile_interval_ms,
+        token=settings.profile_token,
+        keep=settings.profile_keep,
+    )
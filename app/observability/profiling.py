@@ -0,0 +1,246 @@
+# app/observability/profiling.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Profiler of the request being handled; copied into asyncio tasks and threadpool calls
+_current_profiler: ContextVar[Optional["SamplingProfiler"]] = ContextVar("current_profiler", default=None)
+# Set by the middleware while requests are armed; the first tracked endpoint the
+# request runs claims a slot (see `track_threads`)
+_armed_request: ContextVar[Optional["_ArmedRequest"]] = ContextVar("armed_request", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampler for one request.
+
+    A daemon thread wakes every `interval_s`, reads stacks via
+    sys._current_frames() and counts collapsed stacks. Only the request's own
+    threads are sampled: threadpool workers while they run its sync endpoint
+    (registered by `track_threads`), and the event loop thread while the task
+    it is running belongs to the request. Output is the "folded" format
+    (`root;child;leaf count`) read by flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, *, interval_s: float = 0.005, max_depth: int = 128):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.samples: Counter[str] = Counter()
+        self._threads: Set[int] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+        except RuntimeError:
+            pass
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def add_thread(self, tid: int) -> None:
+        self._threads.add(tid)
+
+    def remove_thread(self, tid: int) -> None:
+        self._threads.discard(tid)
+
+    def _loop_runs_request(self) -> bool:
+        # The loop thread also runs other requests' coroutines; count it only
+        # while the current task carries this request's context
+        task = asyncio.current_task(self._loop)
+        return task is not None and task.get_context().get(_current_profiler) is self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            tids = set(self._threads)
+            if self._loop_thread is not None and self._loop_runs_request():
+                tids.add(self._loop_thread)
+            if not tids:
+                continue
+            frames = sys._current_frames()
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate() if t.ident in tids}
+            for tid in tids:
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                stack.append(names.get(tid, f"thread-{tid}"))
+                stack.reverse()
+                self.samples[";".join(stack)] += 1
+
+    def to_folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class _ArmedRequest:
+    """A request that may be profiled if it reaches a tracked endpoint while slots are armed."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.profiler: Optional[SamplingProfiler] = None
+
+    def claim(self) -> Optional[SamplingProfiler]:
+        if self.profiler is None and profile_arm.take():
+            self.profiler = SamplingProfiler(interval_s=self.interval_s)
+            self.profiler.start()
+        return self.profiler
+
+
+def track_threads(func: Callable) -> Callable:
+    """
+    Decorator for sync endpoints: while a profiled request runs the endpoint in
+    FastAPI's threadpool, that worker thread is sampled for it. An armed slot
+    is only used up here, so requests that never reach a tracked endpoint
+    (health checks, /admin, rejected calls) leave the slots alone. Costs two
+    ContextVar lookups per call when nothing is being profiled.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _current_profiler.get()
+        if profiler is None:
+            armed = _armed_request.get()
+            profiler = armed.claim() if armed is not None else None
+        if profiler is None:
+            return func(*args, **kwargs)
+        tid = threading.get_ident()
+        profiler.add_thread(tid)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.remove_thread(tid)
+
+    return wrapper
+
+
+class ProfileArm:
+    """Thread-safe counter of how many upcoming tracked requests should be profiled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0
+
+    def arm(self, n: int) -> int:
+        with self._lock:
+            self._remaining = max(0, n)
+            return self._remaining
+
+    @property
+    def remaining(self) -> int:
+        return self._remaining
+
+    def take(self) -> bool:
+        # Unlocked fast path: the common case is "nothing armed".
+        if self._remaining <= 0:
+            return False
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+
+profile_arm = ProfileArm()
+
+
+def token_matches(given: Optional[str], token: Optional[str]) -> bool:
+    return bool(token) and given is not None and secrets.compare_digest(given, token)
+
+
+def prune_profiles(out_dir: Path, *, keep: int) -> None:
+    files = sorted(out_dir.glob("*.folded"), key=lambda f: f.stat().st_mtime, reverse=True)
+    for f in files[max(0, keep) :]:
+        f.unlink(missing_ok=True)
+
+
+def write_profile(out_dir: Path, profiler: SamplingProfiler, *, label: str, keep: int = 50) -> Optional[Path]:
+    """Writes the profile and prunes all but the newest `keep`; None if nothing was sampled."""
+    if not profiler.samples:
+        return None
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ts = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    safe = label.strip("/").replace("/", "_") or "root"
+    out_path = out_dir / f"{ts}-{safe}-{uuid.uuid4().hex[:8]}.folded"
+    out_path.write_text(profiler.to_folded(), encoding="utf-8")
+    prune_profiles(out_dir, keep=keep)
+    return out_path
+
+
+def install_profiling(app, *, out_dir: Path, interval_ms: float, token: str, keep: int = 50) -> None:
+    """
+    Adds the profiling middleware. Only called when PROFILING_ENABLED and
+    PROFILE_TOKEN are set, so a disabled deployment carries no middleware and
+    no per-request check at all.
+
+    A request is profiled if it sends `X-Profile: 1` with the token in
+    `X-Profile-Token`, or if the admin endpoint armed the next N requests. Armed
+    slots go to requests that run an endpoint decorated with `track_threads`;
+    only its worker thread is sampled for them. The profile file name comes
+    back in `X-Profile-Id`; at most `keep` files are kept.
+    """
+    interval_s = max(0.001, interval_ms / 1000.0)
+
+    def _respond(request, response, profiler: SamplingProfiler):
+        out_path = write_profile(out_dir, profiler, label=request.url.path, keep=keep)
+        if out_path is not None:
+            response.headers[PROFILE_ID_HEADER] = out_path.name
+        return response
+
+    @app.middleware("http")
+    async def _profile_requests(request, call_next):
+        wanted = request.headers.get(PROFILE_HEADER) == "1" and token_matches(
+            request.headers.get(PROFILE_TOKEN_HEADER), token
+        )
+        if not wanted:
+            if profile_arm.remaining <= 0:
+                return await call_next(request)
+            armed = _ArmedRequest(interval_s)
+            ctx_token = _armed_request.set(armed)
+            try:
+                response = await call_next(request)
+            finally:
+                _armed_request.reset(ctx_token)
+                if armed.profiler is not None:
+                    armed.profiler.stop()
+            return response if armed.profiler is None else _respond(request, response, armed.profiler)
+
+        profiler = SamplingProfiler(interval_s=interval_s)
+        ctx_token = _current_profiler.set(profiler)
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+            _current_profiler.reset(ctx_token)
+        return _respond(request, response, profiler)
@@ -4,7 +4,7 @@ import hashlib
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 @dataclass(frozen=True)
@@ -16,6 +16,7 @@ class Chunk:
     permalink_url: Optional[str]
     attribution: str
     text: str
+    revid: Optional[int] = None
 
 
 def _stable_chunk_id(page_title: str, section_path: str, idx: int, text: str) -> str:
@@ -36,15 +37,26 @@ def build_chunks(
     target_tokens: int = 650,
     max_tokens: int = 950,
     overlap_tokens: int = 120,
+) -> List[Chunk]:
+    doc = json.loads(processed_json.read_text(encoding="utf-8"))
+    return chunk_doc(doc, target_tokens=target_tokens, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+def chunk_doc(
+    doc: Dict[str, Any],
+    *,
+    target_tokens: int = 650,
+    max_tokens: int = 950,
+    overlap_tokens: int = 120,
 ) -> List[Chunk]:
     """
     Token-ish chunking using cheap character heuristics.
     Keeps chunks well under embedding token limits for fast iteration.
     """
-    doc = json.loads(processed_json.read_text(encoding="utf-8"))
     page_title = doc["page_title"]
     source_url = doc["source_url"]
     permalink_url = doc.get("permalink_url")
+    revid = doc.get("revid")
     attribution = f"Source: Wikivoyage (CC BY-SA 4.0), page: {page_title}"
 
     blocks = doc["blocks"]
@@ -70,6 +82,7 @@ def build_chunks(
                 permalink_url=permalink_url,
                 attribution=attribution,
                 text=text,
+                revid=revid,
             )
         )
         chunk_idx += 1
@@ -100,8 +113,11 @@ def build_chunks(
 
         if cur_section is None:
             cur_section = section_path
-        elif section_path != cur_section and buf:
-            flush()
+        elif section_path != cur_section:
+            # Switch sections even when the buffer was just flushed, or every
+            # later chunk inherits the first section's path
+            if buf:
+                flush()
             cur_section = section_path
 
         t = _approx_tokens(text)
@@ -118,6 +134,7 @@ def build_chunks(
                     permalink_url=permalink_url,
                     attribution=attribution,
                     text=text,
+                    revid=revid,
                 )
             )
             chunk_idx += 1
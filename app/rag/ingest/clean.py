@@ -4,9 +4,7 @@ import json
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
-
-from bs4 import BeautifulSoup
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -21,26 +19,97 @@ def _normalize_ws(text: str) -> str:
     return text.strip()
 
 
-def html_to_blocks(html: str) -> List[CleanBlock]:
-    soup = BeautifulSoup(html, "lxml")
+_H2_RE = re.compile(r"<h2\b[^>]*>.*?</h2>", re.IGNORECASE | re.DOTALL)
+_TOC_HEADING_RE = re.compile(r"""\bid\s*=\s*["']mw-toc-heading["']""", re.IGNORECASE)
+_TOC_OPEN_RE = re.compile(r"""<div\b[^>]*\bid\s*=\s*["']toc["'][^>]*>""", re.IGNORECASE)
+_DIV_TAG_RE = re.compile(r"<(/?)div\b[^>]*>", re.IGNORECASE)
+
+_STRIP_SELECTORS = [
+    "span.mw-editsection",
+    "sup.reference",
+    "div#toc",
+    "table",
+    "div.navbox",
+    "div.mw-references-wrap",
+]
+
+
+def _approx_tokens(text: str) -> int:
+    # rough heuristic: ~4 chars/token for English-ish text
+    return max(1, len(text) // 4)
+
+
+def section_matches(section_path: str, prefixes: List[str]) -> bool:
+    sp = (section_path or "").strip().lower()
+    return any(sp.startswith(p.strip().lower()) for p in prefixes)
+
+
+def _h2_wanted(h2: str, prefixes: List[str]) -> bool:
+    # Keep the subtree if a prefix matches the h2 itself or points inside it ("See > Museums")
+    h = h2.strip().lower()
+    return any(h.startswith(p.strip().lower()) or p.strip().lower().startswith(h) for p in prefixes)
+
+
+def _heading_text(fragment: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(fragment, "lxml")
+    for t in soup.select("span.mw-editsection"):
+        t.decompose()
+    return _normalize_ws(soup.get_text(" ", strip=True))
+
+
+def _toc_spans(html: str) -> List[Tuple[int, int]]:
+    # (start, end) of each legacy div#toc, matched by counting nested <div>s
+    spans = []
+    for m in _TOC_OPEN_RE.finditer(html):
+        depth = 1
+        end = len(html)
+        for tag in _DIV_TAG_RE.finditer(html, m.end()):
+            depth += -1 if tag.group(1) else 1
+            if depth == 0:
+                end = tag.end()
+                break
+        spans.append((m.start(), end))
+    return spans
+
+
+def _split_h2_sections(html: str) -> Iterator[Tuple[Optional[str], str]]:
+    """
+    Splits rendered page HTML at each <h2> without parsing it, yielding
+    (h2 title or None for the intro, html fragment starting at that h2).
+    Section subtrees can then be skipped before BeautifulSoup ever sees them.
+
+    The legacy TOC's "Contents" <h2> is not a split point: splitting there
+    would cut the TOC list out of div#toc, and _STRIP_SELECTORS would no
+    longer remove it.
+    """
+    toc = _toc_spans(html)
+    starts = [
+        (m.start(), m.group(0))
+        for m in _H2_RE.finditer(html)
+        if not _TOC_HEADING_RE.search(m.group(0)) and not any(a <= m.start() < b for a, b in toc)
+    ]
+    yield None, html[: starts[0][0]] if starts else html
+    for i, (pos, tag) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(html)
+        yield _heading_text(tag), html[pos:end]
+
+
+def _fragment_blocks(fragment: str) -> Iterator[CleanBlock]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(fragment, "lxml")
 
     for tag in soup(["script", "style"]):
         tag.decompose()
 
-    for sel in [
-        "span.mw-editsection",
-        "sup.reference",
-        "div#toc",
-        "table",
-        "div.navbox",
-        "div.mw-references-wrap",
-    ]:
+    for sel in _STRIP_SELECTORS:
         for t in soup.select(sel):
             t.decompose()
 
     root = soup.select_one("div.mw-parser-output") or soup
 
-    blocks: List[CleanBlock] = []
     h2: Optional[str] = None
     h3: Optional[str] = None
 
@@ -66,16 +135,48 @@ def html_to_blocks(html: str) -> List[CleanBlock]:
 
         section_parts = [p for p in [h2, h3] if p]
         section_path = " > ".join(section_parts) if section_parts else "Intro"
-        blocks.append(CleanBlock(section_path=section_path, text=text))
+        yield CleanBlock(section_path=section_path, text=text)
+
+
+def html_to_blocks(
+    html: str,
+    *,
+    sections: Optional[List[str]] = None,
+    token_budget: Optional[int] = None,
+) -> List[CleanBlock]:
+    """
+    sections: keep only blocks whose section path starts with one of these
+        prefixes; non-matching h2 subtrees are skipped without being parsed.
+    token_budget: stop once roughly this many tokens of blocks are collected,
+        so later sections are never parsed.
+    """
+    blocks: List[CleanBlock] = []
+    used = 0
+
+    for h2, fragment in _split_h2_sections(html):
+        if sections and not _h2_wanted(h2 or "Intro", sections):
+            continue
+        for b in _fragment_blocks(fragment):
+            if sections and not section_matches(b.section_path, sections):
+                continue
+            blocks.append(b)
+            used += _approx_tokens(b.text)
+            if token_budget is not None and used >= token_budget:
+                return blocks
 
     return blocks
 
 
-def clean_raw_file(raw_path: Path, processed_dir: Path) -> Path:
-    raw = json.loads(raw_path.read_text(encoding="utf-8"))
-    blocks = html_to_blocks(raw["html"])
+def clean_raw_page(
+    raw: Dict[str, Any],
+    *,
+    sections: Optional[List[str]] = None,
+    token_budget: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Raw page payload (see fetch.raw_page_payload) -> processed doc with text blocks."""
+    blocks = html_to_blocks(raw["html"], sections=sections, token_budget=token_budget)
 
-    doc = {
+    return {
         "page_title": raw["resolved_title"],
         "source_url": raw["source_url"],
         "permalink_url": raw.get("permalink_url"),
@@ -84,6 +185,17 @@ def clean_raw_file(raw_path: Path, processed_dir: Path) -> Path:
         "blocks": [{"section_path": b.section_path, "text": b.text} for b in blocks],
     }
 
+
+def clean_raw_file(
+    raw_path: Path,
+    processed_dir: Path,
+    *,
+    sections: Optional[List[str]] = None,
+    token_budget: Optional[int] = None,
+) -> Path:
+    raw = json.loads(raw_path.read_text(encoding="utf-8"))
+    doc = clean_raw_page(raw, sections=sections, token_budget=token_budget)
+
     processed_dir.mkdir(parents=True, exist_ok=True)
     out_path = processed_dir / raw_path.name
     out_path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
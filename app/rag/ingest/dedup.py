@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.rag.ingest.chunk import Chunk
+
+_MERSENNE_P = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Persistent dedup state, kept next to the collection inside the index dir
+# (and so copied into and published with every snapshot)
+DEDUP_DIR = "dedup"
+SIGNATURES_FILE = "signatures.npy"
+ROWS_FILE = "rows.jsonl"
+LINKS_FILE = "links.json"
+STATE_META_FILE = "meta.json"
+
+
+@dataclass(frozen=True)
+class DedupReport:
+    chunks_in: int
+    chunks_kept: int
+    duplicates: int
+    tokens_saved: int
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks_in} chunks -> {self.chunks_kept} canonical; "
+            f"{self.duplicates} near-duplicates linked; "
+            f"~{self.tokens_saved} tokens and {self.duplicates} vectors saved"
+        )
+
+
+def _shingle_hashes(text: str, k: int) -> List[int]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < k:
+        grams = [" ".join(words)] if words else [text]
+    else:
+        grams = [" ".join(words[i : i + k]) for i in range(len(words) - k + 1)]
+    # 32-bit shingle ids keep (a * x + b) inside uint64 for the permutations below
+    return list({int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams})
+
+
+class MinHasher:
+    """MinHash signatures with universal hashing mod a Mersenne prime."""
+
+    def __init__(self, *, num_perm: int = 64, shingle_words: int = 5, seed: int = 1):
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self._a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_P, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str):
+        import numpy as np
+
+        x = np.asarray(_shingle_hashes(text, self.shingle_words), dtype=np.uint64)
+        h = (x[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(_MERSENNE_P)
+        return h.min(axis=0)
+
+
+def dedup_state_dir(index_dir: Path, collection_name: str) -> Path:
+    return index_dir / DEDUP_DIR / collection_name
+
+
+def _replace_file(path: Path, write) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class CorpusDeduper:
+    """
+    Incremental near-duplicate detection (MinHash + LSH banding) against every
+    canonical chunk indexed so far, not just the current run.
+
+    Only MinHash signatures are held (one row of num_perm uint64 per canonical
+    chunk, with its page and revid), plus the duplicates linked to each
+    canonical chunk; the LSH buckets are rebuilt from the signatures on load.
+    `save()` writes the state under the index dir so the next ingest into a
+    snapshot of it picks it up.
+
+    A chunk is never linked to a chunk of its own page: an edited revision
+    shifts chunk ids, and its unchanged text must replace the old rows rather
+    than merge into them. `retire()` drops the rows of a page's older
+    revisions once its current revision has been seen.
+    """
+
+    def __init__(self, *, threshold: float = 0.85, num_perm: int = 64, bands: int = 16):
+        import numpy as np
+
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        # Row-aligned; a removed row keeps its slot with id None
+        self._ids: List[Optional[str]] = []
+        self._pages: List[Tuple[str, Optional[int]]] = []
+        self._row_of: Dict[str, int] = {}
+        self._rows_of_page: Dict[str, Set[int]] = defaultdict(set)
+        self._sigs = np.empty((0, num_perm), dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        # canonical chunk id -> {duplicate chunk id: {"url", "page", "revid"}}
+        self.links: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # page title -> canonical chunk ids holding one of its duplicates
+        self._linked_from: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._row_of
+
+    def _state_meta(self) -> Dict:
+        return {
+            "format": 2,
+            "num_perm": self.hasher.num_perm,
+            "bands": self.bands,
+            "shingle_words": self.hasher.shingle_words,
+        }
+
+    def _band_keys(self, sig) -> List[Tuple[int, bytes]]:
+        return [(b, sig[b * self.rows : (b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+    def _register(self, chunk_id: str, page: Tuple[str, Optional[int]], sig) -> None:
+        import numpy as np
+
+        row = len(self._ids)
+        if row == len(self._sigs):
+            grown = np.empty((max(1024, 2 * row), self._sigs.shape[1]), dtype=np.uint64)
+            grown[:row] = self._sigs
+            self._sigs = grown
+        self._sigs[row] = sig
+        self._ids.append(chunk_id)
+        self._pages.append(page)
+        self._row_of[chunk_id] = row
+        self._rows_of_page[page[0]].add(row)
+        for key in self._band_keys(sig):
+            self._buckets[key].append(row)
+
+    def _remove(self, chunk_id: str) -> None:
+        row = self._row_of.pop(chunk_id)
+        self._ids[row] = None
+        self._rows_of_page[self._pages[row][0]].discard(row)
+        for key in self._band_keys(self._sigs[row]):
+            self._buckets[key].remove(row)
+        self.links.pop(chunk_id, None)
+
+    def _link(self, canonical: str, chunk_id: str, link: Dict[str, Any]) -> None:
+        self.links.setdefault(canonical, {})[chunk_id] = link
+        self._linked_from[link["page"]].add(canonical)
+
+    def add(self, chunk: Chunk) -> Optional[str]:
+        """
+        Returns the chunk_id of the canonical chunk (of another page) that
+        `chunk` near-duplicates, and links it there. Otherwise registers
+        `chunk` as canonical and returns None; a chunk_id that is already
+        canonical just has its revid brought up to date.
+        """
+        row = self._row_of.get(chunk.chunk_id)
+        if row is not None:
+            self._pages[row] = (chunk.page_title, chunk.revid)
+            return None
+
+        sig = self.hasher.signature(chunk.text)
+        best, best_sim = -1, 0.0
+        for cand in {r for key in self._band_keys(sig) for r in self._buckets.get(key, ())}:
+            if self._pages[cand][0] == chunk.page_title:
+                continue
+            sim = float((self._sigs[cand] == sig).mean())
+            if sim > best_sim:
+                best, best_sim = cand, sim
+
+        if best >= 0 and best_sim >= self.threshold:
+            canonical = self._ids[best]
+            link = {"url": chunk.permalink_url or chunk.source_url, "page": chunk.page_title, "revid": chunk.revid}
+            self._link(canonical, chunk.chunk_id, link)
+            return canonical
+
+        self._register(chunk.chunk_id, (chunk.page_title, chunk.revid), sig)
+        return None
+
+    def retire(self, page_title: str, revid: Optional[int]) -> Tuple[List[str], Set[str]]:
+        """
+        Forgets what older revisions of a page left behind, once every chunk of
+        revision `revid` has gone through `add()`:
+
+        - its duplicate links on other pages' canonical chunks are dropped;
+        - its canonical chunks are removed, after their own duplicate links
+          move to the most similar chunk of the new revision. One that other
+          pages still cite and that has no such successor is kept, so their
+          text stays searchable.
+
+        Returns (chunk ids to delete from the index, canonical ids whose
+        duplicate links changed).
+        """
+        if revid is None:
+            return [], set()
+
+        changed: Set[str] = set()
+        for cid in list(self._linked_from.get(page_title, ())):
+            dups = self.links.get(cid, {})
+            old = [d for d, link in dups.items() if link["page"] == page_title and link["revid"] != revid]
+            for d in old:
+                del dups[d]
+            if old:
+                changed.add(cid)
+            if not any(link["page"] == page_title for link in dups.values()):
+                self._linked_from[page_title].discard(cid)
+
+        rows = self._rows_of_page.get(page_title, set())
+        current = [r for r in rows if self._pages[r][1] == revid]
+        stale = [r for r in rows if self._pages[r][1] != revid]
+        deleted: List[str] = []
+        for row in stale:
+            cid = self._ids[row]
+            dups = self.links.get(cid)
+            if dups:
+                sims = [(float((self._sigs[r] == self._sigs[row]).mean()), r) for r in current]
+                sim, successor = max(sims, default=(0.0, -1))
+                if sim < self.threshold:
+                    continue
+                new_id = self._ids[successor]
+                for d, link in dups.items():
+                    self._link(new_id, d, link)
+                changed.add(new_id)
+            self._remove(cid)
+            changed.discard(cid)
+            deleted.append(cid)
+        return deleted, changed
+
+    @classmethod
+    def load(cls, state_dir: Path, *, threshold: float = 0.85, num_perm: int = 64, bands: int = 16) -> "CorpusDeduper":
+        """State saved under state_dir, or an empty deduper if there is none (or it was built with other parameters)."""
+        import numpy as np
+
+        deduper = cls(threshold=threshold, num_perm=num_perm, bands=bands)
+        meta_path = state_dir / STATE_META_FILE
+        if not meta_path.exists():
+            return deduper
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if {k: meta.get(k) for k in deduper._state_meta()} != deduper._state_meta():
+            print(f"[WARN] dedup state in {state_dir} uses another format or MinHash parameters; starting from scratch")
+            return deduper
+
+        # Files are replaced one by one and meta.json last; `count` marks the consistent prefix
+        n = int(meta["count"])
+        with open(state_dir / ROWS_FILE, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        sigs = np.load(state_dir / SIGNATURES_FILE, mmap_mode="r")
+        if len(rows) < n or len(sigs) < n:
+            print(f"[WARN] dedup state in {state_dir} is incomplete; starting from scratch")
+            return deduper
+        for rec, sig in zip(rows[:n], sigs[:n]):
+            deduper._register(rec["id"], (rec["page"], rec["revid"]), np.asarray(sig))
+
+        links_path = state_dir / LINKS_FILE
+        if links_path.exists():
+            for cid, dups in json.loads(links_path.read_text(encoding="utf-8")).items():
+                for d, link in dups.items():
+                    deduper._link(cid, d, link)
+        return deduper
+
+    def save(self, state_dir: Path) -> None:
+        import numpy as np
+
+        state_dir.mkdir(parents=True, exist_ok=True)
+        live = [row for row, cid in enumerate(self._ids) if cid is not None]
+        rows = "".join(
+            json.dumps({"id": self._ids[r], "page": self._pages[r][0], "revid": self._pages[r][1]}, ensure_ascii=False) + "\n"
+            for r in live
+        )
+        _replace_file(state_dir / SIGNATURES_FILE, lambda f: np.save(f, self._sigs[live]))
+        _replace_file(state_dir / ROWS_FILE, lambda f: f.write(rows.encode("utf-8")))
+        _replace_file(state_dir / LINKS_FILE, lambda f: f.write(json.dumps(self.links, ensure_ascii=False).encode("utf-8")))
+        meta = {**self._state_meta(), "count": len(live)}
+        _replace_file(state_dir / STATE_META_FILE, lambda f: f.write(json.dumps(meta).encode("utf-8")))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import json
+import re
+import tarfile
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from app.rag.ingest.fetch import RawPage, page_urls
+
+# Destination articles (cities, regions, parks...) all have a "Get in" section;
+# travel topics, itineraries and phrasebooks generally don't.
+_DESTINATION_MARKER = re.compile(r"<h2\b[^>]*\bid=\"Get_in\"", re.IGNORECASE)
+
+
+def _open_stream(path: Path) -> IO[bytes]:
+    name = path.name.lower()
+    if name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if name.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_ndjson_lines(path: Path) -> Iterator[bytes]:
+    """
+    Yields NDJSON lines one at a time from a plain, .gz/.bz2, or tar(.gz) dump.
+    Tar archives are read in streaming mode ("r|*"), so nothing is extracted to
+    disk and memory stays bounded by the largest single article.
+    """
+    name = path.name.lower()
+    if name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2")):
+        with tarfile.open(path, mode="r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not member.name.endswith((".ndjson", ".json")):
+                    continue
+                f = tf.extractfile(member)
+                if f is None:
+                    continue
+                for line in f:
+                    yield line
+        return
+
+    with _open_stream(path) as f:
+        for line in f:
+            yield line
+
+
+def is_destination_article(article: Dict[str, Any]) -> bool:
+    ns = (article.get("namespace") or {}).get("identifier", 0)
+    html = (article.get("article_body") or {}).get("html") or ""
+    return ns == 0 and bool(_DESTINATION_MARKER.search(html))
+
+
+def article_to_raw_page(article: Dict[str, Any]) -> RawPage:
+    title = article["name"]
+    revid = (article.get("version") or {}).get("identifier")
+    source_url, permalink_url = page_urls(title, revid)
+    return RawPage(
+        requested_title=title,
+        resolved_title=title,
+        pageid=int(article.get("identifier") or 0),
+        revid=revid,
+        html=article["article_body"]["html"],
+        # No network fetch happened; the revision timestamp is the "as of" time
+        fetched_at=article.get("date_modified") or "",
+        source_url=source_url,
+        permalink_url=permalink_url,
+    )
+
+
+def iter_dump_pages(
+    path: Path,
+    *,
+    titles: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> Iterator[RawPage]:
+    """
+    Streams destination articles out of a Wikimedia Enterprise HTML dump
+    (e.g. enwikivoyage-NS0-<date>-ENTERPRISE-HTML.json.tar.gz), one NDJSON
+    article per line. The rendered HTML goes through the same clean/chunk
+    stages as pages fetched with action=parse.
+    """
+    wanted = {t.replace("_", " ").casefold() for t in titles} if titles else None
+    yielded = 0
+
+    for line in _iter_ndjson_lines(path):
+        line = line.strip()
+        if not line:
+            continue
+        article = json.loads(line)
+        if wanted is not None:
+            # Explicitly requested titles skip the destination heuristic
+            if article.get("name", "").casefold() not in wanted:
+                continue
+        elif not is_destination_article(article):
+            continue
+
+        yield article_to_raw_page(article)
+        yielded += 1
+        if limit is not None and yielded >= limit:
+            return
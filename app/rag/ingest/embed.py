@@ -5,15 +5,13 @@ import time
 from dataclasses import dataclass
 from typing import Iterable, List, Sequence
 
-import numpy as np
-from google import genai
-from google.genai import types
-from google.genai.errors import ClientError
-
-from app.core.config import settings
+from app.core.config import get_settings
+from app.core.deadline import DeadlineExceeded, check_deadline, remaining, timeout_for
 
 
 def _l2_normalize(v: List[float]) -> List[float]:
+    import numpy as np
+
     arr = np.array(v, dtype=np.float32)
     n = np.linalg.norm(arr)
     if n == 0:
@@ -54,6 +52,7 @@ class _RateWindow:
 MAX_TPM = 25000   # below 30K to leave headroom
 MAX_RPM = 80      # below 100 to leave headroom
 MAX_BATCH_TOKENS = 9000  # <= ~3 batches/minute without exceeding TPM
+EMBED_CALL_TIMEOUT_S = 60.0  # per embed_content call; capped by the request deadline
 
 _window = _RateWindow(start=time.monotonic(), used_tokens=0, used_reqs=0)
 
@@ -62,6 +61,10 @@ def _sleep_until_new_window():
     now = time.monotonic()
     elapsed = now - _window.start
     sleep_s = max(0.0, 60.0 - elapsed) + 1.0  # +1s safety buffer
+    left = remaining()
+    if left is not None and sleep_s >= left:
+        # Waiting out the rate window would outlive the request; give up now
+        raise DeadlineExceeded("Deadline exceeded waiting for embedding rate limit")
     time.sleep(sleep_s)
     _window.start = time.monotonic()
     _window.used_tokens = 0
@@ -97,24 +100,38 @@ def embed_texts(
     - gemini-embedding-001 input token limit is 2,048 per text. :contentReference[oaicite:5]{index=5}
     - For smaller dims (e.g. 768/1536), normalize embeddings. :contentReference[oaicite:6]{index=6}
     """
-    client = genai.Client(api_key=settings.effective_api_key) if settings.effective_api_key else genai.Client()
+    import httpx
+    from google import genai
+    from google.genai import types
+    from google.genai.errors import ClientError
 
-    cfg = types.EmbedContentConfig(
-        task_type=task_type,
-        output_dimensionality=output_dimensionality,
-    )
+    settings = get_settings()
+    client = genai.Client(api_key=settings.effective_api_key) if settings.effective_api_key else genai.Client()
 
     out: List[List[float]] = []
 
     for batch in _batch_by_token_budget(texts, max_batch_tokens=MAX_BATCH_TOKENS):
+        check_deadline("embedding")
         batch_tokens = sum(_approx_tokens(t) for t in batch)
         _throttle(batch_tokens, 1)
 
         # retry a couple times if server still says 429 (approx tokens can undercount)
         for attempt in range(3):
+            # HttpOptions.timeout is in milliseconds, and 0 would mean no timeout
+            timeout_ms = max(1, int(timeout_for(EMBED_CALL_TIMEOUT_S) * 1000))
+            cfg = types.EmbedContentConfig(
+                task_type=task_type,
+                output_dimensionality=output_dimensionality,
+                http_options=types.HttpOptions(timeout=timeout_ms),
+            )
             try:
                 res = client.models.embed_content(model=model, contents=batch, config=cfg)
                 break
+            except httpx.TimeoutException as e:
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded("Deadline exceeded during embedding") from e
+                raise
             except ClientError as e:
                 # Handle rate limit
                 if getattr(e, "status_code", None) == 429:
@@ -4,7 +4,7 @@ import json
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
@@ -29,6 +29,18 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def page_urls(title: str, revid: Optional[int]) -> Tuple[str, Optional[str]]:
+    """Canonical page URL and, when the revision is known, its permalink."""
+    source_url = WIKIVOYAGE_PAGE_BASE + title.replace(" ", "_")
+    permalink_url = None
+    if revid:
+        permalink_url = (
+            "https://en.wikivoyage.org/w/index.php?title="
+            f"{title.replace(' ', '_')}&oldid={revid}"
+        )
+    return source_url, permalink_url
+
+
 @retry(
     reraise=True,
     stop=stop_after_attempt(3),
@@ -68,13 +80,7 @@ def fetch_wikivoyage_parse_html(title: str, *, timeout_s: float = 30.0) -> RawPa
     revid = parsed.get("revid")
     html = parsed["text"]
 
-    source_url = WIKIVOYAGE_PAGE_BASE + resolved_title.replace(" ", "_")
-    permalink_url = None
-    if revid:
-        permalink_url = (
-            "https://en.wikivoyage.org/w/index.php?title="
-            f"{resolved_title.replace(' ', '_')}&oldid={revid}"
-        )
+    source_url, permalink_url = page_urls(resolved_title, revid)
 
     return RawPage(
         requested_title=title,
@@ -88,11 +94,8 @@ def fetch_wikivoyage_parse_html(title: str, *, timeout_s: float = 30.0) -> RawPa
     )
 
 
-def save_raw_page(raw: RawPage, out_dir: Path) -> Path:
-    out_dir.mkdir(parents=True, exist_ok=True)
-    safe = raw.resolved_title.replace("/", "_").replace(" ", "_")
-    out_path = out_dir / f"{safe}.json"
-    payload = {
+def raw_page_payload(raw: RawPage) -> Dict[str, Any]:
+    return {
         "requested_title": raw.requested_title,
         "resolved_title": raw.resolved_title,
         "pageid": raw.pageid,
@@ -102,5 +105,11 @@ def save_raw_page(raw: RawPage, out_dir: Path) -> Path:
         "permalink_url": raw.permalink_url,
         "html": raw.html,
     }
-    out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def save_raw_page(raw: RawPage, out_dir: Path) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    safe = raw.resolved_title.replace("/", "_").replace(" ", "_")
+    out_path = out_dir / f"{safe}.json"
+    out_path.write_text(json.dumps(raw_page_payload(raw), ensure_ascii=False, indent=2), encoding="utf-8")
     return out_path
@@ -1,9 +1,219 @@
 from __future__ import annotations
 
+import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
-import chromadb
+
+def checkpoint_path(chroma_path: Path, collection_name: str) -> Path:
+    return chroma_path / f".{collection_name}.ingest-checkpoint"
+
+
+class IndexWriter:
+    """
+    Long-lived index writer for one ingest run.
+
+    - Opens one client/collection for the whole run instead of one per destination.
+    - Buffers rows and upserts them in fixed-size batches (capped by Chroma's
+      max batch size), so memory is bounded by one batch of embeddings.
+    - Appends committed chunk ids to a checkpoint file after every batch. A
+      restarted run reads it back via `committed` and skips those chunks before
+      embedding. `complete()` removes the checkpoint once the run has finished.
+
+    backend="numpy" writes a memory-mapped NumpyIndex under chroma_path instead
+    of a Chroma collection; coarse_dim > 0 adds its Matryoshka first-pass matrix.
+    Batches are appended to the index's staging area and the searchable
+    matrices are built once, in `complete()`. Chroma collections only hold
+    full-dimension vectors.
+    """
+
+    def __init__(
+        self,
+        *,
+        chroma_path: Path,
+        collection_name: str,
+        batch_size: int = 256,
+        coarse_dim: int = 0,
+        backend: str = "chroma",
+        numpy_dtype: str = "float32",
+        resume: bool = True,
+        checkpoint: bool = True,
+        verbose: bool = False,
+    ):
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown index backend: {backend}")
+
+        self.chroma_path = chroma_path
+        self.collection_name = collection_name
+        self.batch_size = max(1, batch_size)
+        self.coarse_dim = coarse_dim
+        self.backend = backend
+        self.numpy_dtype = numpy_dtype
+        self.verbose = verbose
+
+        self._checkpoint = checkpoint_path(chroma_path, collection_name) if checkpoint else None
+        self.committed: Set[str] = set()
+        if self._checkpoint is not None:
+            if resume and self._checkpoint.exists():
+                self.committed = set(self._checkpoint.read_text(encoding="utf-8").split())
+            elif self._checkpoint.exists():
+                self._checkpoint.unlink()
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._embeddings: List[List[float]] = []
+        self._metadatas: List[Dict] = []
+
+        self.rows_written = 0
+        self.seconds = 0.0
+
+        self._collection = None
+        self._numpy_builder = None
+        self._open()
+
+    def _open(self) -> None:
+        self.chroma_path.mkdir(parents=True, exist_ok=True)
+
+        if self.backend == "numpy":
+            from app.rag.numpy_index import NumpyIndexBuilder, numpy_index_dir
+
+            self._numpy_builder = NumpyIndexBuilder(numpy_index_dir(self.chroma_path, self.collection_name))
+            return
+
+        import chromadb
+
+        client = chromadb.PersistentClient(path=str(self.chroma_path))
+        self.batch_size = min(self.batch_size, client.get_max_batch_size())
+        self._collection = client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    def __enter__(self) -> "IndexWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Rows already embedded are worth keeping even if the run is failing
+        self.flush()
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows_written / self.seconds if self.seconds > 0 else 0.0
+
+    def add(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+    ) -> None:
+        self._ids.extend(ids)
+        self._documents.extend(documents)
+        self._embeddings.extend(embeddings)
+        self._metadatas.extend(metadatas)
+        while len(self._ids) >= self.batch_size:
+            self._write(self.batch_size)
+
+    def flush(self) -> None:
+        while self._ids:
+            self._write(self.batch_size)
+
+    def complete(self) -> None:
+        """
+        Flushes, builds the numpy index from its staging area, and drops the
+        checkpoint; the next run starts from scratch.
+        """
+        self.flush()
+        if self._numpy_builder is not None:
+            t0 = time.perf_counter()
+            self._numpy_builder.finalize(coarse_dim=self.coarse_dim, dtype=self.numpy_dtype)
+            if self.verbose:
+                print(f"[INDEX] built numpy index ({time.perf_counter() - t0:.1f}s)")
+        if self._checkpoint is not None and self._checkpoint.exists():
+            self._checkpoint.unlink()
+
+    def metadata(self, ids: List[str]) -> Dict[str, Dict]:
+        """Stored metadata of committed rows, by id (unknown ids are left out)."""
+        self.flush()
+        if self._numpy_builder is not None:
+            return {rec["id"]: rec["metadata"] for rec, _ in self._numpy_builder.records(ids)}
+
+        got = self._collection.get(ids=ids, include=["metadatas"])
+        return {cid: md or {} for cid, md in zip(got["ids"], got["metadatas"])}
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replaces the metadata of committed rows without touching their embeddings."""
+        self.flush()
+        if not ids:
+            return
+        if self._numpy_builder is not None:
+            self._numpy_builder.update_metadata(ids, metadatas)
+            return
+        for start in range(0, len(ids), self.batch_size):
+            self._collection.update(
+                ids=ids[start : start + self.batch_size],
+                metadatas=metadatas[start : start + self.batch_size],
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        """Removes committed rows (unknown ids are ignored)."""
+        self.flush()
+        if not ids:
+            return
+        if self._numpy_builder is not None:
+            self._numpy_builder.delete(ids)
+        else:
+            for start in range(0, len(ids), self.batch_size):
+                self._collection.delete(ids=ids[start : start + self.batch_size])
+        self.committed.difference_update(ids)
+
+    def rows(self, ids: List[str]) -> List[Tuple[str, str, Dict, List[float]]]:
+        """(id, document, metadata, embedding) for committed rows (unknown ids are left out)."""
+        self.flush()
+        if self._numpy_builder is not None:
+            return [
+                (rec["id"], rec["document"], rec["metadata"], [float(x) for x in vec])
+                for rec, vec in self._numpy_builder.records(ids)
+            ]
+
+        got = self._collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        return [
+            (got["ids"][i], got["documents"][i], got["metadatas"][i] or {}, [float(x) for x in got["embeddings"][i]])
+            for i in range(len(got["ids"]))
+        ]
+
+    def _write(self, n: int) -> None:
+        ids, self._ids = self._ids[:n], self._ids[n:]
+        documents, self._documents = self._documents[:n], self._documents[n:]
+        embeddings, self._embeddings = self._embeddings[:n], self._embeddings[n:]
+        metadatas, self._metadatas = self._metadatas[:n], self._metadatas[n:]
+
+        t0 = time.perf_counter()
+        if self._numpy_builder is not None:
+            self._numpy_builder.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+            )
+        else:
+            self._collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+            )
+        self.seconds += time.perf_counter() - t0
+        self.rows_written += len(ids)
+
+        if self._checkpoint is not None:
+            with open(self._checkpoint, "a", encoding="utf-8") as f:
+                f.write("".join(f"{cid}\n" for cid in ids))
+        self.committed.update(ids)
+
+        if self.verbose:
+            print(f"[INDEX] +{len(ids)} rows (total {self.rows_written}, {self.rows_per_s:.1f} rows/s)")
 
 
 def upsert_chunks(
@@ -14,18 +224,20 @@ def upsert_chunks(
     documents: List[str],
     embeddings: List[List[float]],
     metadatas: List[Dict],
+    coarse_dim: int = 0,
+    backend: str = "chroma",
+    numpy_dtype: str = "float32",
+    batch_size: Optional[int] = None,
 ) -> None:
-    chroma_path.mkdir(parents=True, exist_ok=True)
-
-    client = chromadb.PersistentClient(path=str(chroma_path))
-    collection = client.get_or_create_collection(
-        name=collection_name,
-        metadata={"hnsw:space": "cosine"},
-    )
-
-    collection.upsert(
-        ids=ids,
-        documents=documents,
-        embeddings=embeddings,
-        metadatas=metadatas,
-    )
+    """One-shot upsert through an IndexWriter (batched, no checkpoint)."""
+    with IndexWriter(
+        chroma_path=chroma_path,
+        collection_name=collection_name,
+        batch_size=batch_size or max(1, len(ids)),
+        coarse_dim=coarse_dim,
+        backend=backend,
+        numpy_dtype=numpy_dtype,
+        checkpoint=False,
+    ) as writer:
+        writer.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        writer.complete()
@@ -3,93 +3,391 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from app.core.config import settings
-from app.rag.ingest.fetch import fetch_wikivoyage_parse_html, save_raw_page
-from app.rag.ingest.clean import clean_raw_file
-from app.rag.ingest.chunk import build_chunks
-from app.rag.ingest.embed import embed_texts
-from app.rag.ingest.index import upsert_chunks
+from app.core.config import get_settings
+
+if TYPE_CHECKING:
+    from app.rag.ingest.chunk import Chunk
+    from app.rag.ingest.dedup import CorpusDeduper
+    from app.rag.ingest.fetch import RawPage
+    from app.rag.ingest.index import IndexWriter
+    from app.rag.packs import PageRow
 
 ROOT = Path(".")
 RAW_DIR = ROOT / "data" / "raw"
 PROCESSED_DIR = ROOT / "data" / "processed"
 
 
-def _filter_sections(section_path: str, prefixes: List[str]) -> bool:
-    sp = (section_path or "").strip().lower()
-    return any(sp.startswith(p.strip().lower()) for p in prefixes)
-
-
-def ingest_destination(
-    dest: str,
+def prepare_page(
+    raw: RawPage,
     *,
     sections: Optional[List[str]] = None,
     max_chunks: int = 25,
     target_tokens: int = 550,
     max_tokens: int = 850,
     overlap_tokens: int = 0,
-) -> None:
-    raw = fetch_wikivoyage_parse_html(dest)
-    raw_path = save_raw_page(raw, RAW_DIR)
-    processed_path = clean_raw_file(raw_path, PROCESSED_DIR)
-
-    chunks = build_chunks(
-        processed_path,
-        target_tokens=target_tokens,
-        max_tokens=max_tokens,
-        overlap_tokens=overlap_tokens,
-    )
+    save: bool = True,
+) -> List[Chunk]:
+    """
+    Clean -> chunk for one page (no embedding yet). With save=True the raw
+    and processed JSON are also written to data/raw and data/processed;
+    dump ingests skip that and stay in memory.
+    """
+    # Stage imports are deferred so `--help` doesn't pay for httpx/bs4/genai/chromadb
+    from app.rag.ingest.fetch import raw_page_payload, save_raw_page
+    from app.rag.ingest.clean import clean_raw_file, clean_raw_page
+    from app.rag.ingest.chunk import build_chunks, chunk_doc
+
+    # Section selection and the chunk limit are applied while cleaning, so
+    # unwanted sections are never parsed and parsing stops once there is
+    # enough text for max_chunks chunks.
+    token_budget = max_chunks * max_tokens if max_chunks > 0 else None
+    chunk_kwargs = dict(target_tokens=target_tokens, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
 
-    # Keep only selected sections (optional)
-    if sections:
-        chunks = [c for c in chunks if _filter_sections(c.section_path, sections)]
+    if save:
+        raw_path = save_raw_page(raw, RAW_DIR)
+        processed_path = clean_raw_file(raw_path, PROCESSED_DIR, sections=sections, token_budget=token_budget)
+        chunks = build_chunks(processed_path, **chunk_kwargs)
+    else:
+        doc = clean_raw_page(raw_page_payload(raw), sections=sections, token_budget=token_budget)
+        chunks = chunk_doc(doc, **chunk_kwargs)
 
     # Keep only first N chunks (small-data mode)
     if max_chunks > 0:
         chunks = chunks[:max_chunks]
 
+    return chunks
+
+
+def fetch_pages(destinations: List[str]) -> Iterator[RawPage]:
+    from app.rag.ingest.fetch import fetch_wikivoyage_parse_html
+
+    for d in destinations:
+        yield fetch_wikivoyage_parse_html(d)
+
+
+def prepare_destination(dest: str, **prepare_kwargs: Any) -> List[Chunk]:
+    """Fetch -> clean -> chunk for one destination (no embedding yet)."""
+    chunks = prepare_page(next(fetch_pages([dest])), **prepare_kwargs)
     if not chunks:
         raise RuntimeError("No chunks produced. Try different --sections or increase --max-chunks.")
+    return chunks
+
+
+def _with_duplicates(md: Dict[str, Any], links: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Near-duplicates aren't indexed; keep their citations on the canonical chunk.
+    `links` maps each duplicate's chunk_id to its citation (see
+    CorpusDeduper.links). Chroma metadata values must be scalars, so lists
+    are newline-joined.
+    """
+    md = {k: v for k, v in md.items() if k not in ("also_cited_in", "duplicate_ids")}
+    if links:
+        others = dict.fromkeys(link["url"] for link in links.values())
+        others.pop(md.get("source_url"), None)
+        if others:
+            md["also_cited_in"] = "\n".join(others)
+        md["duplicate_ids"] = "\n".join(links)
+    return md
+
+
+def _chunk_metadata(c: Chunk, links: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    md: Dict[str, Any] = {
+        "page_title": c.page_title,
+        "section_path": c.section_path,
+        "source_url": c.permalink_url or c.source_url,
+        "attribution": c.attribution,
+    }
+    if c.revid is not None:
+        md["revid"] = c.revid
+    return _with_duplicates(md, links)
+
 
-    texts = [c.text for c in chunks]
+def _link_duplicates(writer: IndexWriter, deduper: CorpusDeduper, canonical_ids: List[str]) -> None:
+    """
+    Rewrites the duplicate citations of canonical chunks already in the index:
+    chunks from earlier runs, and chunks of this run written before one of
+    their duplicates turned up.
+    """
+    ids = []
+    for start in range(0, len(canonical_ids), writer.batch_size):
+        batch = canonical_ids[start : start + writer.batch_size]
+        stored = writer.metadata(batch)
+        found = [cid for cid in batch if cid in stored]
+        writer.update_metadata(found, [_with_duplicates(stored[cid], deduper.links.get(cid, {})) for cid in found])
+        ids.extend(found)
+    if ids:
+        print(f"[DEDUP] linked duplicates to {len(ids)} indexed chunks")
 
-    print(f"[INFO] {dest}: embedding {len(texts)} chunks (small-data mode)")
 
-    doc_embeddings = embed_texts(
-        texts,
-        model=settings.gemini_embed_model,
-        task_type="RETRIEVAL_DOCUMENT",
-        output_dimensionality=768,
+def _retire_old_revisions(writer: IndexWriter, deduper: CorpusDeduper, page_title: str, revid: Optional[int]) -> Set[str]:
+    """
+    Deletes the rows older revisions of a page left in the index, once the
+    stream has moved past its current revision. Returns the canonical ids
+    whose duplicate citations changed.
+    """
+    deleted, changed = deduper.retire(page_title, revid)
+    if deleted:
+        writer.delete(deleted)
+        print(f"[DEDUP] {page_title} (rev {revid}): removed {len(deleted)} chunks of older revisions")
+    return changed
+
+
+class _PackCollector:
+    """
+    Builds the knowledge pack of every page revision the run touches from the
+    chunks in hand: rows are kept as they are embedded (canonical sections
+    only), and chunks committed before a restart are read back by id. A
+    near-duplicate stands in for its page with the canonical chunk's row,
+    under its own section and citation. A page's pack is written once all its
+    chunks are in the index. A new revid replaces the old pack; a revision
+    with none of the canonical sections removes it.
+    """
+
+    def __init__(self, writer: IndexWriter, index_dir: Path, *, per_section: int):
+        self.writer = writer
+        self.index_dir = index_dir
+        self.per_section = per_section
+        # (page_title, revid) -> (rows in hand, ids to read back, (canonical id, duplicate) pairs)
+        self._pages: Dict[Tuple[str, Optional[int]], Tuple[List[PageRow], List[str], List[Tuple[str, Chunk]]]] = {}
+
+    def touch(self, c: Chunk) -> None:
+        self._pages.setdefault((c.page_title, c.revid), ([], [], []))
+
+    def add(self, c: Chunk, embedding: List[float], metadata: Dict[str, Any]) -> None:
+        from app.rag.packs import _canonical_section
+
+        if _canonical_section(c.section_path):
+            self._pages[(c.page_title, c.revid)][0].append((c.chunk_id, c.text, metadata, embedding))
+
+    def add_committed(self, c: Chunk) -> None:
+        from app.rag.packs import _canonical_section
+
+        if _canonical_section(c.section_path):
+            self._pages[(c.page_title, c.revid)][1].append(c.chunk_id)
+
+    def add_duplicate(self, c: Chunk, canonical_id: str) -> None:
+        from app.rag.packs import _canonical_section
+
+        if _canonical_section(c.section_path):
+            self._pages[(c.page_title, c.revid)][2].append((canonical_id, c))
+
+    def write(self, *, keep: Optional[Tuple[str, Optional[int]]] = None) -> None:
+        """Writes the packs of every collected page except `keep` (still being streamed)."""
+        from app.rag.packs import build_pack, write_pack
+
+        for key in [k for k in self._pages if k != keep]:
+            page_title, revid = key
+            rows, committed, duplicates = self._pages.pop(key)
+            if committed:
+                rows = rows + self.writer.rows(committed)
+            if duplicates:
+                canonical = {row[0]: row for row in self.writer.rows([cid for cid, _ in duplicates])}
+                for cid, c in duplicates:
+                    if cid in canonical:
+                        _, text, md, emb = canonical[cid]
+                        md = {**md, "section_path": c.section_path, "source_url": c.permalink_url or c.source_url}
+                        rows.append((c.chunk_id, text, md, emb))
+            pack = build_pack(page_title, revid, rows, per_section=self.per_section)
+            write_pack(self.index_dir, page_title, pack)
+            n = sum(len(v) for v in pack["sections"].values()) if pack else 0
+            print(f"[PACK] {page_title} (rev {revid}): {n} chunks")
+
+
+def index_chunks(
+    chunks: Iterable[Chunk],
+    *,
+    dedup_threshold: float = 0.85,
+    resume: bool = True,
+) -> None:
+    """
+    Dedup -> embed -> upsert, streaming. `chunks` is consumed lazily, and each
+    new canonical chunk waits only until a writer batch is full before it is
+    embedded and written, so memory holds one batch plus the dedup signatures.
+
+    Near-duplicates are detected against every chunk seen so far on other
+    pages, including the chunks of earlier runs (state saved in the index, see
+    CorpusDeduper). A page's new revision replaces the rows of its older ones.
+    Chunks committed by an interrupted earlier run are skipped before embedding.
+    """
+    from app.rag.ingest.chunk import _approx_tokens
+    from app.rag.ingest.dedup import CorpusDeduper, DedupReport, dedup_state_dir
+    from app.rag.ingest.embed import embed_texts
+    from app.rag.ingest.index import IndexWriter
+    from app.rag.snapshots import begin_snapshot, publish_snapshot, release_snapshot
+
+    settings = get_settings()
+
+    index_dir = begin_snapshot(settings.chroma_dir) if settings.index_snapshots else settings.chroma_dir
+
+    try:
+        deduper = None
+        if dedup_threshold > 0:
+            state_dir = dedup_state_dir(index_dir, settings.chroma_collection)
+            deduper = CorpusDeduper.load(state_dir, threshold=dedup_threshold)
+            print(f"[DEDUP] checking against {len(deduper)} chunks from earlier runs")
+
+        with IndexWriter(
+            chroma_path=index_dir,
+            collection_name=settings.chroma_collection,
+            batch_size=settings.index_batch_size,
+            coarse_dim=settings.effective_coarse_dim,
+            backend=settings.index_backend,
+            numpy_dtype=settings.numpy_index_dtype,
+            resume=resume,
+            verbose=True,
+        ) as writer:
+            links = deduper.links if deduper is not None else {}
+            packs = None
+            if settings.pack_chunks_per_section > 0:
+                packs = _PackCollector(writer, index_dir, per_section=settings.pack_chunks_per_section)
+            pending: List[Chunk] = []
+
+            def embed_pending() -> None:
+                texts = [c.text for c in pending]
+                doc_embeddings = embed_texts(
+                    texts,
+                    model=settings.gemini_embed_model,
+                    task_type="RETRIEVAL_DOCUMENT",
+                    output_dimensionality=settings.embed_dim,
+                )
+                metadatas = [_chunk_metadata(c, links.get(c.chunk_id, {})) for c in pending]
+                writer.add(
+                    ids=[c.chunk_id for c in pending],
+                    documents=texts,
+                    embeddings=doc_embeddings,
+                    metadatas=metadatas,
+                )
+                if packs is not None:
+                    for c, emb, md in zip(pending, doc_embeddings, metadatas):
+                        packs.add(c, emb, md)
+                    # Pages before the one being streamed have all their chunks in hand now
+                    packs.write(keep=(pending[-1].page_title, pending[-1].revid))
+                pending.clear()
+
+            seen: Set[str] = set()
+            linked: Set[str] = set()
+            page: Optional[Tuple[str, Optional[int]]] = None
+            chunks_in = kept = skipped = tokens_saved = 0
+
+            for c in chunks:
+                chunks_in += 1
+                if deduper is not None and (c.page_title, c.revid) != page:
+                    # Chunks arrive page by page; the previous page is complete
+                    if page is not None:
+                        linked |= _retire_old_revisions(writer, deduper, *page)
+                    page = (c.page_title, c.revid)
+                if c.chunk_id in seen:
+                    # Same stable id = same page/section/text; nothing new to cite
+                    continue
+                seen.add(c.chunk_id)
+                if packs is not None:
+                    packs.touch(c)
+
+                canonical = deduper.add(c) if deduper is not None else None
+                if canonical is not None:
+                    linked.add(canonical)
+                    tokens_saved += _approx_tokens(c.text)
+                    if packs is not None:
+                        packs.add_duplicate(c, canonical)
+                    continue
+
+                kept += 1
+                if c.chunk_id in writer.committed:
+                    skipped += 1
+                    if packs is not None:
+                        packs.add_committed(c)
+                    continue
+                pending.append(c)
+                if len(pending) >= writer.batch_size:
+                    embed_pending()
+
+            if chunks_in == 0:
+                raise RuntimeError("No chunks produced from any page.")
+            if page is not None:
+                linked |= _retire_old_revisions(writer, deduper, *page)
+            if pending:
+                embed_pending()
+            if packs is not None:
+                packs.write()
+            if skipped:
+                print(f"[RESUME] {skipped} chunks already committed; skipped them")
+
+            if deduper is not None:
+                duplicates = len(seen) - kept
+                report = DedupReport(chunks_in=chunks_in, chunks_kept=kept, duplicates=duplicates, tokens_saved=tokens_saved)
+                print(f"[DEDUP] {report.summary()}")
+                _link_duplicates(writer, deduper, sorted(linked))
+
+            writer.complete()
+            if deduper is not None:
+                deduper.save(state_dir)
+    except BaseException:
+        # Keep the snapshot for a resumed run, but let other ingests use it
+        if settings.index_snapshots:
+            release_snapshot(index_dir)
+        raise
+
+    if settings.index_snapshots:
+        publish_snapshot(settings.chroma_dir, index_dir, keep=settings.snapshot_keep)
+        print(f"[SNAPSHOT] published {index_dir.name}")
+
+    print(
+        f"[OK] {writer.rows_written} chunks indexed into {settings.chroma_collection} "
+        f"({writer.rows_per_s:.1f} rows/s upsert)"
     )
 
-    ids = [c.chunk_id for c in chunks]
-    metadatas = [
-        {
-            "page_title": c.page_title,
-            "section_path": c.section_path,
-            "source_url": c.permalink_url or c.source_url,
-            "attribution": c.attribution,
-        }
-        for c in chunks
-    ]
-
-    upsert_chunks(
-        chroma_path=settings.chroma_dir,
-        collection_name=settings.chroma_collection,
-        ids=ids,
-        documents=texts,
-        embeddings=doc_embeddings,
-        metadatas=metadatas,
+
+def _page_chunks(pages: Iterable[RawPage], *, skip_empty: bool, **prepare_kwargs: Any) -> Iterator[Chunk]:
+    for raw in pages:
+        got = prepare_page(raw, **prepare_kwargs)
+        if not got:
+            if skip_empty:
+                print(f"[SKIP] {raw.resolved_title}: no chunks")
+                continue
+            raise RuntimeError("No chunks produced. Try different --sections or increase --max-chunks.")
+        print(f"[INFO] {raw.resolved_title}: {len(got)} chunks")
+        yield from got
+
+
+def ingest_corpus(
+    pages: Iterable[RawPage],
+    *,
+    dedup_threshold: float = 0.85,
+    skip_empty: bool = False,
+    resume: bool = True,
+    save_pages: bool = True,
+    **prepare_kwargs: Any,
+) -> None:
+    """
+    Streams pages through clean -> chunk -> dedup -> embed -> upsert. Every
+    chunk is checked for near-duplicates (city pages vs. their districts,
+    shared "Stay safe" boilerplate) against everything seen before it, in
+    this run and earlier ones, before it is sent to the embedding API.
+
+    `pages` is consumed lazily and only dedup signatures outlive a page, so a
+    dump is never held in memory as a whole. save_pages=False keeps the raw
+    and processed page JSON out of data/raw and data/processed.
+    """
+    index_chunks(
+        _page_chunks(pages, skip_empty=skip_empty, save=save_pages, **prepare_kwargs),
+        dedup_threshold=dedup_threshold,
+        resume=resume,
     )
 
-    print(f"[OK] {dest}: {len(chunks)} chunks indexed into {settings.chroma_collection}")
+
+def ingest_destination(dest: str, *, dedup_threshold: float = 0.85, **prepare_kwargs: Any) -> None:
+    ingest_corpus(fetch_pages([dest]), dedup_threshold=dedup_threshold, **prepare_kwargs)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--destinations", nargs="+", required=True)
+    parser.add_argument("--destinations", nargs="+", default=None)
+
+    # Offline source: Wikimedia Enterprise HTML dump instead of action=parse
+    parser.add_argument("--dump", type=Path, default=None, help="Local Wikivoyage HTML dump (.ndjson[.gz] or .tar.gz)")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many dump articles")
 
     # Small-data controls
     parser.add_argument("--sections", nargs="*", default=None, help="Only embed sections that start with these prefixes")
@@ -97,18 +395,43 @@ def main():
     parser.add_argument("--target-tokens", type=int, default=550)
     parser.add_argument("--max-tokens", type=int, default=850)
     parser.add_argument("--overlap-tokens", type=int, default=0)
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.85,
+        help="Estimated Jaccard similarity above which chunks are merged as near-duplicates (0 disables)",
+    )
+
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignore the checkpoint left by an interrupted run and re-embed everything",
+    )
 
     args = parser.parse_args()
 
-    for d in args.destinations:
-        ingest_destination(
-            d,
-            sections=args.sections,
-            max_chunks=args.max_chunks,
-            target_tokens=args.target_tokens,
-            max_tokens=args.max_tokens,
-            overlap_tokens=args.overlap_tokens,
-        )
+    if args.dump:
+        from app.rag.ingest.dump import iter_dump_pages
+
+        # --destinations narrows a dump to specific titles
+        pages = iter_dump_pages(args.dump, titles=args.destinations, limit=args.limit)
+    elif args.destinations:
+        pages = fetch_pages(args.destinations)
+    else:
+        parser.error("one of --destinations or --dump is required")
+
+    ingest_corpus(
+        pages,
+        dedup_threshold=args.dedup_threshold,
+        skip_empty=bool(args.dump),
+        resume=not args.no_resume,
+        save_pages=not args.dump,
+        sections=args.sections,
+        max_chunks=args.max_chunks,
+        target_tokens=args.target_tokens,
+        max_tokens=args.max_tokens,
+        overlap_tokens=args.overlap_tokens,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,440 @@
+# app/rag/numpy_index.py
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+META_FILE = "meta.json"
+FULL_FILE = "full.f32.npy"
+COARSE_FILE = "coarse.npy"
+SCALE_FILE = "coarse_scale.npy"
+OFFSETS_FILE = "offsets.npy"
+RECORDS_FILE = "records.jsonl"
+
+# Staging area an ingest run appends to; NumpyIndexBuilder.finalize() turns it into the files above
+STAGING_SUFFIX = ".staging"
+STAGING_META = "staging.json"
+STAGING_VECTORS = "full.f32.bin"
+STAGING_LOG = "rows.log"
+
+# Rows scored per matmul when the coarse matrix is int8. Each block is widened
+# to a float32 temporary (numpy has no BLAS int8 matmul), so keep it small:
+# 1024 x 256 dims is 1 MB per query, and was also the fastest block size.
+# float32 matrices are scored in one BLAS call and need no temporary.
+SEARCH_BLOCK_ROWS = 1024
+# Rows converted per step when building coarse/int8 matrices at finalize
+BUILD_BLOCK_ROWS = 8192
+
+
+def numpy_index_dir(root: Path, collection_name: str) -> Path:
+    return root / f"{collection_name}.npindex"
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32)
+
+
+def _quantize_int8(mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-row quantization: row ~= q * scale, q in [-127, 127]
+    import numpy as np
+
+    scale = np.abs(mat).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(mat / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+class NumpyIndex:
+    """
+    Flat vector index stored as .npy files and opened with mmap, so every uvicorn
+    worker shares the same page-cache copy instead of loading its own.
+
+    Layout (one directory per collection):
+    - full.f32.npy       N x dim float32, L2-normalized; used for exact rescoring
+    - coarse.npy         N x coarse_dim, float32 or int8 (Matryoshka-truncated, re-normalized)
+    - coarse_scale.npy   N float32 per-row scales when coarse is int8
+    - records.jsonl      {"id", "document", "metadata"} per row; offsets.npy holds byte offsets
+    - meta.json          dim, coarse_dim, dtype, count
+
+    Search is a blocked matmul over the coarse matrix for candidates, then an exact
+    dot product against the full-dimension rows of those candidates.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._meta: Optional[Dict[str, Any]] = None
+        self._full = None
+        self._coarse = None
+        self._scale = None
+        self._offsets = None
+
+    # ---------- reading ----------
+
+    def exists(self) -> bool:
+        return (self.path / META_FILE).exists()
+
+    def open(self) -> "NumpyIndex":
+        import numpy as np
+
+        self._meta = json.loads((self.path / META_FILE).read_text(encoding="utf-8"))
+        self._full = np.load(self.path / FULL_FILE, mmap_mode="r")
+        self._offsets = np.load(self.path / OFFSETS_FILE, mmap_mode="r")
+        if self._meta["coarse_dim"]:
+            self._coarse = np.load(self.path / COARSE_FILE, mmap_mode="r")
+            if self._meta["dtype"] == "int8":
+                self._scale = np.load(self.path / SCALE_FILE, mmap_mode="r")
+        else:
+            self._coarse = self._full
+        return self
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        if self._meta is None:
+            self.open()
+        return self._meta
+
+    def __len__(self) -> int:
+        return int(self.meta["count"])
+
+    def _records(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        out = []
+        with open(self.path / RECORDS_FILE, "rb") as f:
+            for r in rows:
+                f.seek(int(self._offsets[r]))
+                out.append(json.loads(f.readline()))
+        return out
+
+    def _coarse_scores(self, q: np.ndarray) -> np.ndarray:
+        import numpy as np
+
+        if self._coarse.dtype != np.int8:
+            return self._coarse @ q
+
+        n = len(self)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            block = self._coarse[start : start + SEARCH_BLOCK_ROWS]
+            s = block.astype(np.float32) @ q
+            s *= self._scale[start : start + SEARCH_BLOCK_ROWS]
+            scores[start : start + len(block)] = s
+        return scores
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        *,
+        top_k: int,
+        candidates: int,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Returns (record, cosine distance) pairs, closest first."""
+        import numpy as np
+
+        if self._full is None:
+            self.open()
+        n = len(self)
+        if n == 0:
+            return []
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        coarse_dim = self.meta["coarse_dim"]
+        if coarse_dim:
+            qc = q[:coarse_dim]
+            qc = qc / (np.linalg.norm(qc) or 1.0)
+        else:
+            qc = q
+            candidates = top_k  # single stage is already exact
+
+        scores = self._coarse_scores(qc)
+        k = min(n, max(top_k, candidates))
+        cand = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        cand.sort()  # ascending row order keeps the mmap reads sequential
+
+        exact = self._full[cand] @ q
+        best = np.argsort(-exact)[:top_k]
+        rows = cand[best]
+        return list(zip(self._records(rows), (1.0 - exact[best]).tolist()))
+
+    # ---------- writing ----------
+
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        coarse_dim: int = 0,
+        dtype: str = "float32",
+    ) -> None:
+        """One-shot upsert + rebuild. Streaming writers use NumpyIndexBuilder directly."""
+        builder = NumpyIndexBuilder(self.path)
+        builder.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        builder.finalize(coarse_dim=coarse_dim, dtype=dtype)
+        self._full = self._coarse = self._scale = self._offsets = self._meta = None
+
+
+class NumpyIndexBuilder:
+    """
+    Append-only writer for a NumpyIndex, for the length of one ingest run.
+
+    Batches go into `<index>.staging/`: vectors are written in place into a raw
+    float32 file (appended for new ids, overwritten for existing ones), records
+    are appended to records.jsonl, and each write appends (row, record offset)
+    to rows.log. A batch therefore costs O(batch), not O(index). Only the
+    id -> row map and the offsets stay in memory. Deletes log the row with
+    offset -1 and are dropped when the index is built.
+
+    `finalize()` builds full.f32.npy, the coarse/int8 matrices, a compacted
+    records.jsonl and meta.json once, in blocks, and swaps them in by rename
+    so readers never open a half-written matrix. The staging directory
+    survives a crash; reopening it resumes from the last logged row.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.staging = path.with_name(path.name + STAGING_SUFFIX)
+        self.dim: Optional[int] = None
+        self._row_of: Dict[str, int] = {}
+        self._offsets: List[int] = []
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def _open(self) -> None:
+        import numpy as np
+
+        if (self.staging / STAGING_META).exists():
+            self._resume()
+            return
+
+        if self.staging.exists():
+            shutil.rmtree(self.staging)
+        self.staging.mkdir(parents=True)
+        (self.staging / STAGING_VECTORS).touch()
+        (self.staging / RECORDS_FILE).touch()
+        (self.staging / STAGING_LOG).touch()
+
+        index = NumpyIndex(self.path)
+        if not index.exists():
+            return
+
+        # Seed from the published index: one sequential copy per run
+        index.open()
+        self._set_dim(int(index.meta["dim"]))
+        with open(self.staging / STAGING_VECTORS, "wb") as f:
+            for start in range(0, len(index), BUILD_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(index._full[start : start + BUILD_BLOCK_ROWS]).tobytes())
+        shutil.copyfile(self.path / RECORDS_FILE, self.staging / RECORDS_FILE)
+        offsets = np.asarray(index._offsets, dtype=np.int64)
+        log = np.stack([np.arange(len(offsets), dtype=np.int64), offsets], axis=1)
+        log.tofile(self.staging / STAGING_LOG)
+        self._load_log(log)
+
+    def _resume(self) -> None:
+        import numpy as np
+
+        self.dim = json.loads((self.staging / STAGING_META).read_text(encoding="utf-8"))["dim"]
+        log_path = self.staging / STAGING_LOG
+        n_pairs = log_path.stat().st_size // 16
+        with open(log_path, "r+b") as f:
+            f.truncate(n_pairs * 16)  # drop a torn trailing entry
+        self._load_log(np.fromfile(log_path, dtype=np.int64).reshape(-1, 2))
+
+        # Rows are written before their log entry, so everything logged is complete
+        with open(self.staging / STAGING_VECTORS, "r+b") as f:
+            f.truncate(len(self._offsets) * self.dim * 4)
+
+    def _load_log(self, log: np.ndarray) -> None:
+        offsets: List[int] = []
+        for row, off in log.tolist():
+            if row == len(offsets):
+                offsets.append(off)
+            else:
+                offsets[row] = off
+        self._offsets = offsets
+        with open(self.staging / RECORDS_FILE, "rb") as f:
+            for row, off in enumerate(offsets):
+                if off < 0:
+                    continue
+                f.seek(off)
+                self._row_of[json.loads(f.readline())["id"]] = row
+
+    def _set_dim(self, dim: int) -> None:
+        self.dim = dim
+        (self.staging / STAGING_META).write_text(json.dumps({"dim": dim}), encoding="utf-8")
+
+    def _append_records(self, rows: List[int], records: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        pairs = []
+        with open(self.staging / RECORDS_FILE, "ab") as f:
+            for row, rec in zip(rows, records):
+                pairs.append((row, f.tell()))
+                f.write(json.dumps(rec, ensure_ascii=False).encode("utf-8") + b"\n")
+        return pairs
+
+    def _log(self, pairs: List[Tuple[int, int]]) -> None:
+        import numpy as np
+
+        with open(self.staging / STAGING_LOG, "ab") as f:
+            f.write(np.asarray(pairs, dtype=np.int64).tobytes())
+        for row, off in pairs:
+            if row == len(self._offsets):
+                self._offsets.append(off)
+            else:
+                self._offsets[row] = off
+
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+    ) -> None:
+        import numpy as np
+
+        if not ids:
+            return
+        vecs = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        if self.dim is None:
+            self._set_dim(int(vecs.shape[1]))
+        if vecs.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {vecs.shape[1]} does not match index dim {self.dim}")
+
+        rows: List[int] = []
+        next_row = len(self._offsets)
+        for cid in ids:
+            row = self._row_of.get(cid)
+            if row is None:
+                row = self._row_of[cid] = next_row
+                next_row += 1
+            rows.append(row)
+
+        records = [{"id": cid, "document": documents[i], "metadata": metadatas[i]} for i, cid in enumerate(ids)]
+        pairs = self._append_records(rows, records)
+
+        row_bytes = self.dim * 4
+        with open(self.staging / STAGING_VECTORS, "r+b") as f:
+            for i, row in enumerate(rows):
+                f.seek(row * row_bytes)
+                f.write(vecs[i].tobytes())
+
+        self._log(pairs)
+
+    def records(self, ids: Sequence[str]) -> List[Tuple[Dict[str, Any], np.ndarray]]:
+        """(record, vector) for the ids already written; unknown ids are skipped."""
+        import numpy as np
+
+        out = []
+        row_bytes = (self.dim or 0) * 4
+        with open(self.staging / RECORDS_FILE, "rb") as rf, open(self.staging / STAGING_VECTORS, "rb") as vf:
+            for cid in ids:
+                row = self._row_of.get(cid)
+                if row is None:
+                    continue
+                rf.seek(self._offsets[row])
+                vf.seek(row * row_bytes)
+                out.append((json.loads(rf.readline()), np.frombuffer(vf.read(row_bytes), dtype=np.float32)))
+        return out
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replaces the metadata of rows already written (unknown ids are skipped)."""
+        found = {rec["id"]: (rec, self._row_of[rec["id"]]) for rec, _ in self.records(ids)}
+        rows, records = [], []
+        for cid, md in zip(ids, metadatas):
+            if cid in found:
+                rec, row = found[cid]
+                rows.append(row)
+                records.append({**rec, "metadata": md})
+        if rows:
+            self._log(self._append_records(rows, records))
+
+    def delete(self, ids: List[str]) -> None:
+        """Drops rows already written (unknown ids are skipped)."""
+        rows = [self._row_of.pop(cid) for cid in ids if cid in self._row_of]
+        if rows:
+            self._log([(row, -1) for row in rows])
+
+    def finalize(self, *, coarse_dim: int = 0, dtype: str = "float32") -> None:
+        """Builds the searchable index from the staging area, swaps it in and removes staging."""
+        import numpy as np
+
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported numpy index dtype: {dtype}")
+        live = np.flatnonzero(np.asarray(self._offsets, dtype=np.int64) >= 0)
+        n = len(live)
+        if self.dim is None or n == 0:
+            if self.dim is not None and self.path.exists():
+                # Every row was deleted
+                shutil.rmtree(self.path)
+            shutil.rmtree(self.staging, ignore_errors=True)
+            return
+        dim = self.dim
+        coarse_dim = coarse_dim if 0 < coarse_dim < dim else 0
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+
+        src = np.memmap(self.staging / STAGING_VECTORS, dtype=np.float32, mode="r", shape=(len(self._offsets), dim))
+        full = np.lib.format.open_memmap(tmp / FULL_FILE, mode="w+", dtype=np.float32, shape=(n, dim))
+
+        # No truncation requested but int8 wanted: quantize the full vectors for the first pass
+        first_dim = coarse_dim or (dim if dtype == "int8" else 0)
+        coarse = scale = None
+        if first_dim:
+            coarse = np.lib.format.open_memmap(
+                tmp / COARSE_FILE, mode="w+", dtype=np.int8 if dtype == "int8" else np.float32, shape=(n, first_dim)
+            )
+            if dtype == "int8":
+                scale = np.lib.format.open_memmap(tmp / SCALE_FILE, mode="w+", dtype=np.float32, shape=(n,))
+
+        for start in range(0, n, BUILD_BLOCK_ROWS):
+            block = np.asarray(src[live[start : start + BUILD_BLOCK_ROWS]])
+            end = start + len(block)
+            full[start:end] = block
+            if coarse is None:
+                continue
+            part = _normalize_rows(block[:, :coarse_dim]) if coarse_dim else block
+            if dtype == "int8":
+                coarse[start:end], scale[start:end] = _quantize_int8(part)
+            else:
+                coarse[start:end] = part
+        for arr in (full, coarse, scale):
+            if arr is not None:
+                arr.flush()
+        del src, full, coarse, scale
+
+        # Compact records: one line per live row, in row order
+        offsets = np.zeros(n, dtype=np.int64)
+        with open(self.staging / RECORDS_FILE, "rb") as rf, open(tmp / RECORDS_FILE, "wb") as wf:
+            for i, row in enumerate(live.tolist()):
+                rf.seek(self._offsets[row])
+                offsets[i] = wf.tell()
+                wf.write(rf.readline())
+        np.save(tmp / OFFSETS_FILE, offsets)
+
+        meta = {"dim": dim, "coarse_dim": first_dim, "dtype": dtype, "count": n}
+        (tmp / META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+
+        old = self.path.with_name(self.path.name + ".old")
+        if old.exists():
+            shutil.rmtree(old)
+        if self.path.exists():
+            os.replace(self.path, old)
+        os.replace(tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        shutil.rmtree(self.staging, ignore_errors=True)
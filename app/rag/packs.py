@@ -0,0 +1,142 @@
+# app/rag/packs.py
+from __future__ import annotations
+
+import json
+import os
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import get_settings
+from app.schemas.tool_results import RAGChunk
+
+PACKS_DIR = "packs"
+
+# Sections most /plan requests end up needing for a destination
+CANONICAL_SECTIONS = ["See", "Do", "Eat", "Get around", "Stay safe"]
+
+# (id, document, metadata, embedding), as ingest has them in hand or IndexWriter.rows returns them
+PageRow = Tuple[str, str, Dict[str, Any], List[float]]
+
+
+def pack_slug(destination: str) -> str:
+    return re.sub(r"[^\w]+", "_", destination.strip().casefold()).strip("_")
+
+
+def pack_path(index_dir: Path, destination: str) -> Path:
+    return index_dir / PACKS_DIR / f"{pack_slug(destination)}.json"
+
+
+def _canonical_section(section_path: str) -> Optional[str]:
+    h2 = (section_path or "").split(" > ")[0].strip().casefold()
+    for name in CANONICAL_SECTIONS:
+        if h2 == name.casefold():
+            return name
+    return None
+
+
+def build_pack(
+    page_title: str,
+    revid: Optional[int],
+    rows: Sequence[PageRow],
+    *,
+    per_section: int = 3,
+    dedup_threshold: float = 0.85,
+) -> Optional[Dict[str, Any]]:
+    """
+    Picks the top chunks per canonical section of one page revision.
+
+    Chunks are ranked by cosine similarity to their section's centroid (the
+    most "typical" content first) using the embeddings already in the index,
+    and near-duplicates of a higher-ranked pick are dropped. Returns None when
+    the page has none of the canonical sections.
+    """
+    import numpy as np
+
+    from app.rag.ingest.dedup import MinHasher
+
+    by_section: Dict[str, List[PageRow]] = {}
+    for row in rows:
+        name = _canonical_section(row[2].get("section_path", ""))
+        if name:
+            by_section.setdefault(name, []).append(row)
+    if not by_section:
+        return None
+
+    hasher = MinHasher()
+    sections: Dict[str, List[Dict[str, Any]]] = {}
+    for name in CANONICAL_SECTIONS:
+        group = by_section.get(name)
+        if not group:
+            continue
+        mat = np.asarray([r[3] for r in group], dtype=np.float32)
+        mat /= np.linalg.norm(mat, axis=1, keepdims=True).clip(min=1e-12)
+        centroid = mat.mean(axis=0)
+        centroid /= np.linalg.norm(centroid) or 1.0
+        scores = mat @ centroid
+
+        picked: List[Dict[str, Any]] = []
+        picked_sigs = []
+        for i in np.argsort(-scores):
+            _, text, md, _ = group[i]
+            sig = hasher.signature(text)
+            if any(float((sig == s).mean()) >= dedup_threshold for s in picked_sigs):
+                continue
+            picked_sigs.append(sig)
+            chunk = RAGChunk(
+                text=text,
+                source_url=md.get("source_url") or "",
+                title=f"{page_title} > {md.get('section_path') or name}",
+                score=float(np.clip(scores[i], 0.0, 1.0)),
+            )
+            picked.append(chunk.model_dump())
+            if len(picked) >= per_section:
+                break
+        sections[name] = picked
+
+    return {
+        "page_title": page_title,
+        "revid": revid,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "sections": sections,
+    }
+
+
+def write_pack(index_dir: Path, page_title: str, pack: Optional[Dict[str, Any]]) -> None:
+    """Writes (or, for pack=None, removes) a page's pack; atomic via os.replace."""
+    path = pack_path(index_dir, page_title)
+    if pack is None:
+        path.unlink(missing_ok=True)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(pack, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+@lru_cache(maxsize=256)
+def _read_pack(path: Path, mtime_ns: int) -> Dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def load_pack(destination: str) -> Optional[Dict[str, Any]]:
+    """O(1) lookup of a destination's pack in the published index snapshot."""
+    from app.rag.snapshots import current_index_dir
+
+    path = pack_path(current_index_dir(get_settings().chroma_dir), destination)
+    try:
+        pack = _read_pack(path, path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    return pack
+
+
+def pack_sources(destination: str, sections: Optional[Sequence[str]] = None) -> List[RAGChunk]:
+    """Pack chunks as RAGChunk citations; empty when the destination has no pack."""
+    pack = load_pack(destination)
+    if pack is None:
+        return []
+    wanted = sections or CANONICAL_SECTIONS
+    return [RAGChunk(**c) for name in wanted for c in pack["sections"].get(name, [])]
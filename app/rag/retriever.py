@@ -1,48 +1,145 @@
 from __future__ import annotations
 
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional
 
-import chromadb
-
-from app.core.config import settings
+from app.core.config import get_settings
+from app.core.deadline import check_deadline
 from app.rag.ingest.embed import embed_texts
 
 
+def _to_chunk(chunk_id: str, text: str, distance: float, md: Dict[str, Any] | None) -> Dict[str, Any]:
+    md = md or {}
+    return {
+        "chunk_id": chunk_id,
+        "text": text,
+        "score_distance": float(distance),
+        "source_url": md.get("source_url"),
+        "page_title": md.get("page_title"),
+        "section_path": md.get("section_path"),
+        "attribution": md.get("attribution"),
+        "also_cited_in": md["also_cited_in"].split("\n") if md.get("also_cited_in") else [],
+    }
+
+
+@lru_cache(maxsize=4)
+def _open_numpy_index(path: Path, mtime_ns: int):
+    # Keyed by meta.json mtime so a rebuilt index is reopened; the mmaps stay
+    # open for the life of the worker and share pages with the other workers
+    from app.rag.numpy_index import NumpyIndex
+
+    return NumpyIndex(path).open()
+
+
+class _ChromaClients:
+    """
+    One PersistentClient per published snapshot, refcounted by the requests
+    using it.
+
+    Chroma keeps a System (SQLite connections, loaded HNSW segments) per path
+    until the client is closed. Once CURRENT moves to a new snapshot, the
+    previous snapshot's client is closed as soon as its last in-flight request
+    finishes, so a worker holds at most the current snapshot plus any still
+    being read, however many snapshots get published.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Path, Any] = {}
+        self._users: Dict[Path, int] = {}
+        self._current: Optional[Path] = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @contextmanager
+    def use(self, path: Path) -> Iterator[Any]:
+        with self._lock:
+            self._current = path
+            client = self._clients.get(path)
+            if client is None:
+                import chromadb
+
+                client = self._clients[path] = chromadb.PersistentClient(path=str(path))
+            self._users[path] = self._users.get(path, 0) + 1
+            stale = self._pop_idle()
+        self._close(stale)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._users[path] -= 1
+                stale = self._pop_idle()
+            self._close(stale)
+
+    def _pop_idle(self) -> List[Any]:
+        idle = [p for p in self._clients if p != self._current and not self._users.get(p)]
+        for p in idle:
+            self._users.pop(p, None)
+        return [self._clients.pop(p) for p in idle]
+
+    @staticmethod
+    def _close(clients: List[Any]) -> None:
+        for client in clients:
+            client.close()  # stops the System once no other client shares the path
+
+
+_chroma_clients = _ChromaClients()
+
+
+def _index_dir() -> Path:
+    # Resolved on every retrieval (one tiny file read), so workers switch to a
+    # newly published snapshot between requests without a restart
+    from app.rag.snapshots import current_index_dir
+
+    return current_index_dir(get_settings().chroma_dir)
+
+
+def _retrieve_numpy(q_emb: List[float], top_k: int) -> List[Dict[str, Any]]:
+    from app.rag.numpy_index import META_FILE, numpy_index_dir
+
+    settings = get_settings()
+    path = numpy_index_dir(_index_dir(), settings.chroma_collection)
+    index = _open_numpy_index(path, (path / META_FILE).stat().st_mtime_ns)
+    hits = index.search(q_emb, top_k=top_k, candidates=top_k * max(1, settings.coarse_candidates_factor))
+    return [_to_chunk(rec["id"], rec["document"], dist, rec["metadata"]) for rec, dist in hits]
+
+
 def retrieve(query: str, *, top_k: int = 5) -> List[Dict[str, Any]]:
     """
     Returns a list of RAG chunks with citations.
     Distances are cosine distance (0 = most similar).
-    """
-    client = chromadb.PersistentClient(path=str(settings.chroma_dir))
-    col = client.get_collection(name=settings.chroma_collection)
 
+    With the numpy backend, candidates come from a wide search over Matryoshka-
+    truncated vectors and are rescored exactly at full dimension. Chroma is
+    searched in one pass: a second HNSW index for truncated vectors costs more
+    memory and latency than it saves there.
+    """
+    check_deadline("retrieval")
+    settings = get_settings()
     q_emb = embed_texts(
         [query],
         model=settings.gemini_embed_model,
         task_type="RETRIEVAL_QUERY",
-        output_dimensionality=768,
+        output_dimensionality=settings.embed_dim,
     )[0]
+    check_deadline("vector search")
+
+    if settings.index_backend == "numpy":
+        return _retrieve_numpy(q_emb, top_k)
 
-    res = col.query(
-        query_embeddings=[q_emb],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"],
-    )
-
-    out: List[Dict[str, Any]] = []
-    for i in range(len(res["ids"][0])):
-        md = res["metadatas"][0][i] or {}
-        out.append(
-            {
-                "chunk_id": res["ids"][0][i],
-                "text": res["documents"][0][i],
-                "score_distance": float(res["distances"][0][i]),
-                "source_url": md.get("source_url"),
-                "page_title": md.get("page_title"),
-                "section_path": md.get("section_path"),
-                "attribution": md.get("attribution"),
-            }
+    with _chroma_clients.use(_index_dir()) as client:
+        col = client.get_collection(name=settings.chroma_collection)
+        res = col.query(
+            query_embeddings=[q_emb],
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"],
         )
 
-    return out
+    return [
+        _to_chunk(res["ids"][0][i], res["documents"][0][i], res["distances"][0][i], res["metadatas"][0][i])
+        for i in range(len(res["ids"][0]))
+    ]
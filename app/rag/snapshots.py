@@ -0,0 +1,175 @@
+# app/rag/snapshots.py
+from __future__ import annotations
+
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+BUILDING_MARKER = ".building"
+# Held (exclusive) by the ingest writing a snapshot, from begin_snapshot until publish/release
+LOCK_FILE = ".lock"
+# Briefly held while scanning for / creating a snapshot to write into
+ROOT_LOCK_FILE = ".snapshots.lock"
+
+# Snapshot -> open lock file, for the snapshots this process is writing
+_held_locks: Dict[Path, IO[bytes]] = {}
+
+
+def _lock(path: Path, *, blocking: bool) -> Optional[IO[bytes]]:
+    """Exclusive advisory lock on `path`; None if it is held elsewhere (non-blocking) or gone."""
+    try:
+        f = open(path, "a+b")
+    except OSError:
+        return None
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+@contextmanager
+def _root_locked(root: Path) -> Iterator[None]:
+    root.mkdir(parents=True, exist_ok=True)
+    f = _lock(root / ROOT_LOCK_FILE, blocking=True)
+    try:
+        yield
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _snapshots_root(root: Path) -> Path:
+    return root / SNAPSHOTS_DIR
+
+
+def current_snapshot_name(root: Path) -> Optional[str]:
+    try:
+        name = (root / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def current_index_dir(root: Path) -> Path:
+    """
+    Directory readers should open. `root/CURRENT` names the published snapshot;
+    without it (indexes built before snapshots existed) the root itself is used.
+    """
+    name = current_snapshot_name(root)
+    return _snapshots_root(root) / name if name else root
+
+
+def _building_snapshots(root: Path) -> List[Path]:
+    snaps = _snapshots_root(root)
+    if not snaps.exists():
+        return []
+    return sorted(p for p in snaps.iterdir() if (p / BUILDING_MARKER).exists())
+
+
+def begin_snapshot(root: Path) -> Path:
+    """
+    Returns a private directory for an ingest run to write into, locked for
+    this process until publish_snapshot/release_snapshot.
+
+    An unpublished snapshot left by an interrupted run (its lock is free) is
+    reused, so its checkpoint lets the run resume. If every unpublished
+    snapshot is locked by a running ingest, this waits for that ingest to
+    finish rather than writing into the same directory or publishing over its
+    updates. Otherwise the published index is copied into a new snapshot and
+    the run writes on top of it. Serving workers keep reading the published
+    snapshot, so they never wait on the writer's locks.
+    """
+    while True:
+        with _root_locked(root):
+            building = _building_snapshots(root)
+            for snap in reversed(building):
+                lock = _lock(snap / LOCK_FILE, blocking=False)
+                if lock is None:
+                    continue
+                if (snap / BUILDING_MARKER).exists():
+                    _held_locks[snap] = lock
+                    return snap
+                lock.close()  # published between the scan and the lock
+            if not building:
+                return _new_snapshot(root)
+
+        busy = building[-1]
+        print(f"[SNAPSHOT] waiting for the ingest writing {busy.name}")
+        lock = _lock(busy / LOCK_FILE, blocking=True)
+        if lock is not None:
+            lock.close()
+
+
+def _new_snapshot(root: Path) -> Path:
+    # Names sort chronologically (microsecond UTC timestamp), which GC relies on
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    snap = _snapshots_root(root) / f"{stamp}-{uuid.uuid4().hex[:8]}"
+    src = current_index_dir(root)
+    if src != root:
+        shutil.copytree(src, snap, ignore=shutil.ignore_patterns(LOCK_FILE))
+    else:
+        # Migrate a pre-snapshot index that lives directly in root
+        snap.mkdir(parents=True)
+        for p in root.iterdir():
+            if p.name in (SNAPSHOTS_DIR, CURRENT_FILE, ROOT_LOCK_FILE):
+                continue
+            (shutil.copytree if p.is_dir() else shutil.copy2)(p, snap / p.name)
+
+    _held_locks[snap] = _lock(snap / LOCK_FILE, blocking=False)
+    (snap / BUILDING_MARKER).touch()
+    return snap
+
+
+def release_snapshot(snap: Path) -> None:
+    """Drops this process's lock without publishing; the snapshot stays resumable."""
+    lock = _held_locks.pop(snap, None)
+    if lock is not None:
+        lock.close()
+
+
+def publish_snapshot(root: Path, snap: Path, *, keep: int = 2) -> None:
+    """
+    Atomically points CURRENT at `snap` (write temp file + os.replace), then
+    garbage-collects old snapshots, keeping the newest `keep` published ones so
+    requests still running against the previous version can finish.
+    """
+    (snap / BUILDING_MARKER).unlink(missing_ok=True)
+
+    tmp = root / f"{CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+    tmp.write_text(snap.name, encoding="utf-8")
+    os.replace(tmp, root / CURRENT_FILE)
+    release_snapshot(snap)
+
+    gc_snapshots(root, keep=keep)
+
+
+def gc_snapshots(root: Path, *, keep: int = 2) -> List[Path]:
+    current = current_snapshot_name(root)
+    snaps = _snapshots_root(root)
+    if not snaps.exists():
+        return []
+
+    published = sorted(p for p in snaps.iterdir() if p.is_dir() and not (p / BUILDING_MARKER).exists())
+    removed = []
+    for p in published[: max(0, len(published) - max(1, keep))]:
+        if p.name == current:
+            continue
+        shutil.rmtree(p, ignore_errors=True)
+        removed.append(p)
+    return removed
@@ -0,0 +1,181 @@
+"""
+Benchmarks the vector index backends on synthetic Matryoshka-like vectors.
+
+Each backend runs in its own interpreter so RSS numbers are not shared. Reports
+recall@k against brute-force full-dimension search, query latency and memory
+(RssAnon = private to the worker, RssFile = mmap'd pages shareable across workers).
+
+    python scripts/bench_index.py --n 50000 --queries 200
+    python scripts/bench_index.py --backends numpy-int8 numpy-float32
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+BACKENDS = ["chroma", "numpy-float32", "numpy-int8"]
+
+
+def _rss_kb() -> dict[str, int]:
+    out = {}
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            key, _, val = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                out[key] = int(val.split()[0])
+    except OSError:
+        import resource
+
+        out["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return out
+
+
+def _dataset(n: int, dim: int, queries: int, seed: int):
+    import numpy as np
+
+    # Decaying per-dimension variance mimics Matryoshka embeddings, where the
+    # leading dimensions carry most of the signal.
+    rng = np.random.default_rng(seed)
+    sigma = np.exp(-np.arange(dim) / (dim / 4)).astype(np.float32)
+    centers = rng.normal(size=(max(1, n // 50), dim)).astype(np.float32) * sigma
+    x = centers[rng.integers(0, len(centers), n)] + rng.normal(size=(n, dim)).astype(np.float32) * sigma * 0.5
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    q = x[rng.integers(0, n, queries)] + rng.normal(size=(queries, dim)).astype(np.float32) * sigma * 0.2
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return x, q
+
+
+def _build(args) -> dict:
+    from app.rag.ingest.index import IndexWriter
+
+    x, _ = _dataset(args.n, args.dim, args.queries, args.seed)
+    ids = [str(i) for i in range(args.n)]
+    backend, _, dtype = args.worker.partition("-")
+
+    # Streams batches through one writer, like an ingest run
+    t0 = time.perf_counter()
+    with IndexWriter(
+        chroma_path=Path(args.root),
+        collection_name="bench",
+        batch_size=args.batch,
+        coarse_dim=args.coarse_dim,
+        backend=backend,
+        numpy_dtype=dtype or "float32",
+        checkpoint=False,
+    ) as writer:
+        for start in range(0, args.n, args.batch):
+            end = start + args.batch
+            writer.add(
+                ids=ids[start:end],
+                documents=ids[start:end],
+                embeddings=x[start:end].tolist(),
+                metadatas=[{"i": i} for i in range(start, min(end, args.n))],
+            )
+        writer.complete()
+    return {"build_s": round(time.perf_counter() - t0, 2)}
+
+
+def _search(args) -> dict:
+    # Runs in a fresh process so the RSS delta covers only opening + querying the index
+    import numpy as np
+
+    x, q = _dataset(args.n, args.dim, args.queries, args.seed)
+    truth = np.argsort(-(q @ x.T), axis=1)[:, : args.top_k]
+    del x
+    backend, _, _ = args.worker.partition("-")
+    if backend == "chroma":
+        import chromadb  # noqa: F401  (library import cost is not index memory)
+
+    rss_before = _rss_kb()
+    search = _searcher(backend, Path(args.root), args)
+    lat, hits = [], 0
+    for qi, qv in enumerate(q):
+        t0 = time.perf_counter()
+        got = search(qv.tolist())
+        lat.append((time.perf_counter() - t0) * 1000)
+        hits += len(set(truth[qi].tolist()) & set(got))
+    rss_after = _rss_kb()
+
+    lat.sort()
+    return {
+        "recall_at_k": round(hits / (len(q) * args.top_k), 4),
+        "p50_ms": round(lat[len(lat) // 2], 3),
+        "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3),
+        "rss_delta_kb": {k: rss_after.get(k, 0) - rss_before.get(k, 0) for k in rss_after},
+    }
+
+
+def _searcher(backend: str, root: Path, args):
+    if backend == "numpy":
+        from app.rag.numpy_index import NumpyIndex, numpy_index_dir
+
+        index = NumpyIndex(numpy_index_dir(root, "bench")).open()
+        cands = args.top_k * args.candidates_factor
+        return lambda v: [int(rec["id"]) for rec, _ in index.search(v, top_k=args.top_k, candidates=cands)]
+
+    import chromadb
+
+    col = chromadb.PersistentClient(path=str(root)).get_collection("bench")
+    return lambda v: [int(i) for i in col.query(query_embeddings=[v], n_results=args.top_k, include=[])["ids"][0]]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--coarse-dim", type=int, default=256)
+    parser.add_argument("--candidates-factor", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--phase", choices=["build", "search"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--root", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_build(args) if args.phase == "build" else _search(args)))
+        return 0
+
+    passthrough = list(sys.argv[1:])
+    if "--backends" in passthrough:
+        i = passthrough.index("--backends")
+        j = i + 1
+        while j < len(passthrough) and not passthrough[j].startswith("--"):
+            j += 1
+        del passthrough[i:j]
+
+    print(f"n={args.n} dim={args.dim} coarse_dim={args.coarse_dim} top_k={args.top_k} queries={args.queries}")
+    for b in args.backends:
+        r = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for phase in ("build", "search"):
+                out = subprocess.run(
+                    [sys.executable, __file__, *passthrough, "--worker", b, "--phase", phase, "--root", tmp],
+                    capture_output=True,
+                    text=True,
+                )
+                if out.returncode != 0:
+                    err = out.stderr.strip().splitlines()
+                    print(f"[FAIL] {b} ({phase}): {err[-1] if err else out.returncode}")
+                    break
+                r.update(json.loads(out.stdout.strip().splitlines()[-1]))
+            else:
+                rss = ", ".join(f"{k}={v / 1024:.1f}MB" for k, v in r["rss_delta_kb"].items())
+                print(
+                    f"{b:>14}  recall@{args.top_k}={r['recall_at_k']:.3f}  "
+                    f"p50={r['p50_ms']:.2f}ms  p95={r['p95_ms']:.2f}ms  build={r['build_s']}s  {rss}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""
+End-to-end check of the offline dump ingest on a tiny fixture.
+
+Streams scripts/fixtures/wikivoyage_sample.ndjson.gz through iter_dump_pages
+and ingest_corpus into a throwaway CHROMA_DIR and checks that:
+
+- only destination articles are indexed (no travel topics or talk pages)
+- every chunk keeps its citation: source_url is the revid permalink, plus
+  the attribution line
+- the shared "Stay safe" paragraph is indexed once and cites both pages
+- the index and the knowledge packs are populated, and every page's pack
+  has each canonical section the page has (including ones dedup folded into
+  another page's chunk)
+- nothing is written to data/raw or data/processed
+
+Embeddings are deterministic fakes, so no API key is needed.
+
+    python scripts/check_dump_ingest.py [--backend chroma numpy]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+FIXTURE = ROOT / "scripts" / "fixtures" / "wikivoyage_sample.ndjson.gz"
+DIM = 32
+
+# Fixture contents
+DESTINATIONS = {"Lisbon": 4810001, "Lisbon/Alfama": 4810002}
+NOT_DESTINATIONS = {"Portuguese phrasebook", "Talk:Lisbon"}
+
+
+def fake_embed(texts, *, model=None, task_type=None, output_dimensionality=DIM):
+    import numpy as np
+
+    out = []
+    for t in texts:
+        seed = int.from_bytes(hashlib.sha1(t.encode("utf-8")).digest()[:4], "little")
+        v = np.random.default_rng(seed).normal(size=output_dimensionality).astype(np.float32)
+        out.append((v / np.linalg.norm(v)).tolist())
+    return out
+
+
+def _permalink(title: str, revid: int) -> str:
+    from app.rag.ingest.fetch import page_urls
+
+    return page_urls(title, revid)[1]
+
+
+def _page_sections() -> dict[str, set[str]]:
+    """Canonical sections each fixture destination has, from its own chunks."""
+    from app.rag.ingest.dump import iter_dump_pages
+    from app.rag.ingest.run import prepare_page
+    from app.rag.packs import _canonical_section
+
+    out: dict[str, set[str]] = {}
+    for raw in iter_dump_pages(FIXTURE):
+        chunks = prepare_page(raw, save=False, sections=None, max_chunks=25)
+        names = {_canonical_section(c.section_path) for c in chunks}
+        if raw.resolved_title in DESTINATIONS:
+            out[raw.resolved_title] = {n for n in names if n}
+    return out
+
+
+def check_backend(backend: str, workdir: Path) -> list[str]:
+    import app.rag.ingest.embed as embed
+    import app.rag.retriever as retriever
+    from app.core.config import get_settings
+    from app.rag.ingest.dump import iter_dump_pages
+    from app.rag.ingest.run import ingest_corpus
+    from app.rag.packs import load_pack
+
+    os.environ.update(CHROMA_DIR=str(workdir / "index"), INDEX_BACKEND=backend)
+    get_settings.cache_clear()
+    embed.embed_texts = retriever.embed_texts = fake_embed
+    failures = []
+
+    ingest_corpus(iter_dump_pages(FIXTURE), skip_empty=True, save_pages=False, sections=None, max_chunks=25)
+
+    rows = retriever.retrieve("Lisbon", top_k=100)
+    print(f"[INFO] {backend}: {len(rows)} chunks indexed")
+    if not rows:
+        return [f"{backend}: index is empty"]
+
+    titles = {r["page_title"] for r in rows}
+    if titles != set(DESTINATIONS):
+        failures.append(f"{backend}: indexed pages {sorted(titles)}, want {sorted(DESTINATIONS)}")
+    if titles & NOT_DESTINATIONS:
+        failures.append(f"{backend}: non-destination articles indexed: {sorted(titles & NOT_DESTINATIONS)}")
+
+    for r in rows:
+        title = r["page_title"]
+        if title not in DESTINATIONS:
+            continue
+        if r["source_url"] != _permalink(title, DESTINATIONS[title]):
+            failures.append(f"{backend}: {title} chunk cites {r['source_url']}, want the revid permalink")
+            break
+        if f"page: {title}" not in (r["attribution"] or ""):
+            failures.append(f"{backend}: {title} chunk has attribution {r['attribution']!r}")
+            break
+
+    stay_safe = [r for r in rows if r["section_path"] == "Stay safe"]
+    if len(stay_safe) != 1:
+        failures.append(f"{backend}: shared Stay safe paragraph indexed {len(stay_safe)} times, want 1")
+    else:
+        cited = {stay_safe[0]["source_url"], *stay_safe[0]["also_cited_in"]}
+        want = {_permalink(t, revid) for t, revid in DESTINATIONS.items()}
+        if cited != want:
+            failures.append(f"{backend}: Stay safe chunk cites {sorted(cited)}, want {sorted(want)}")
+
+    page_sections = _page_sections()
+    for title, revid in DESTINATIONS.items():
+        pack = load_pack(title)
+        if pack is None or not any(pack["sections"].values()):
+            failures.append(f"{backend}: no knowledge pack for {title}")
+            continue
+        if pack["revid"] != revid:
+            failures.append(f"{backend}: {title} pack is for revid {pack['revid']}, want {revid}")
+        have = {k for k, v in pack["sections"].items() if v}
+        print(f"[INFO] {backend}: {title} pack sections {sorted(have)}")
+        missing = page_sections[title] - have
+        if missing:
+            failures.append(f"{backend}: {title} pack is missing sections {sorted(missing)}")
+    for title in NOT_DESTINATIONS:
+        if load_pack(title) is not None:
+            failures.append(f"{backend}: pack built for non-destination {title}")
+
+    for d in ("data/raw", "data/processed"):
+        if (workdir / d).exists():
+            failures.append(f"{backend}: dump ingest wrote page JSON to {d}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", nargs="+", choices=["chroma", "numpy"], default=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    os.environ.update(EMBED_DIM=str(DIM), INDEX_SNAPSHOTS="1", PACK_CHUNKS_PER_SECTION="3")
+    failures = []
+    cwd = os.getcwd()
+    for backend in args.backend:
+        with tempfile.TemporaryDirectory() as tmp:
+            # data/raw and data/processed are relative to the working directory
+            os.chdir(tmp)
+            try:
+                failures += check_backend(backend, Path(tmp))
+            finally:
+                os.chdir(cwd)
+
+    for f in failures:
+        print(f"[FAIL] {f}")
+    if not failures:
+        print("[OK] dump ingest indexes destinations with citations, dedups, and builds packs")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+"""
+Snapshot swap checks against a throwaway CHROMA_DIR.
+
+- Client eviction: a separate writer process publishes --publishes snapshots
+  while this process serves retrievals from them; fails if the serving side
+  holds on to Chroma systems (SQLite connections, HNSW segments) of snapshots
+  that are no longer current.
+- Ingest locking: a second ingest started while one is running must wait and
+  build on top of its published snapshot (no shared directory, no lost
+  update), and a crashed ingest's snapshot must be reused.
+
+Embeddings are deterministic fakes, so no API key is needed.
+
+    python scripts/check_snapshots.py [--publishes 5]
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+DIM = 32
+
+
+def fake_embed(texts, *, model=None, task_type=None, output_dimensionality=DIM):
+    import numpy as np
+
+    out = []
+    for t in texts:
+        seed = int.from_bytes(hashlib.sha1(t.encode("utf-8")).digest()[:4], "little")
+        v = np.random.default_rng(seed).normal(size=output_dimensionality).astype(np.float32)
+        out.append((v / np.linalg.norm(v)).tolist())
+    return out
+
+
+def _publish(n: int, *, hold_s: float = 0.0, crash: bool = False) -> None:
+    # Writer side: one snapshot with a few rows, then swap CURRENT
+    from app.core.config import get_settings
+    from app.rag.ingest.index import IndexWriter
+    from app.rag.snapshots import begin_snapshot, publish_snapshot
+
+    settings = get_settings()
+    snap = begin_snapshot(settings.chroma_dir)
+    print(f"SNAP={snap.name}", flush=True)
+    texts = [f"publish {n} row {i}" for i in range(4)]
+    with IndexWriter(chroma_path=snap, collection_name=settings.chroma_collection, checkpoint=False) as writer:
+        writer.add(
+            ids=[f"p{n}-{i}" for i in range(4)],
+            documents=texts,
+            embeddings=fake_embed(texts),
+            metadatas=[{"page_title": f"P{n}"} for _ in texts],
+        )
+        writer.complete()
+    if crash:
+        os._exit(1)
+    time.sleep(hold_s)
+    publish_snapshot(settings.chroma_dir, snap, keep=settings.snapshot_keep)
+
+
+def _cached_systems() -> int:
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    return len(SharedSystemClient._identifier_to_system)
+
+
+def check_client_eviction(publishes: int) -> list[str]:
+    import app.rag.retriever as retriever
+    from app.core.config import get_settings
+
+    retriever.embed_texts = fake_embed
+    failures = []
+
+    def publish(n: int) -> None:
+        subprocess.run(_writer(n), cwd=ROOT, env=os.environ, check=True, capture_output=True)
+
+    publish(0)
+    retriever.retrieve("warm up", top_k=1)
+    for n in range(1, publishes + 1):
+        publish(n)
+        hits = retriever.retrieve(f"publish {n} row 0", top_k=1)
+        if not hits or hits[0]["page_title"] != f"P{n}":
+            failures.append(f"publish {n}: retrieval did not see the new snapshot ({hits})")
+        systems = _cached_systems()
+        print(f"[INFO] publish {n}: {systems} cached Chroma system(s), {len(retriever._chroma_clients)} client(s)")
+        if systems > 1:
+            failures.append(f"publish {n}: {systems} Chroma systems cached after the swap (want 1)")
+
+    # A request still reading the old snapshot keeps it open until it finishes
+    old_dir = retriever._index_dir()
+    with retriever._chroma_clients.use(old_dir):
+        publish(publishes + 1)
+        retriever.retrieve("in flight", top_k=1)
+        if _cached_systems() != 2:
+            failures.append(f"in-flight request: {_cached_systems()} systems cached (want old + new = 2)")
+    if _cached_systems() != 1:
+        failures.append(f"after in-flight request: {_cached_systems()} systems cached (want 1)")
+
+    snaps = len(list((get_settings().chroma_dir / "snapshots").iterdir()))
+    if snaps > get_settings().snapshot_keep:
+        failures.append(f"{snaps} snapshot directories on disk (SNAPSHOT_KEEP={get_settings().snapshot_keep})")
+    return failures
+
+
+def _writer(n: int, *extra: str) -> list[str]:
+    return [sys.executable, __file__, "--publish", str(n), *extra]
+
+
+def _snap_name(stdout: str) -> str:
+    return next(ln[len("SNAP=") :] for ln in stdout.splitlines() if ln.startswith("SNAP="))
+
+
+def _published_ids(root: Path) -> set[str]:
+    import chromadb
+
+    from app.rag.snapshots import current_index_dir
+
+    client = chromadb.PersistentClient(path=str(current_index_dir(root)))
+    try:
+        return set(client.get_collection("wikivoyage_chunks").get(include=[])["ids"])
+    finally:
+        client.close()
+
+
+def check_ingest_locking(root: Path) -> list[str]:
+    failures = []
+    subprocess.run(_writer(0), cwd=ROOT, env=os.environ, check=True, capture_output=True)
+
+    # A holds its snapshot for a while before publishing; B starts meanwhile
+    a = subprocess.Popen(_writer(1, "--hold-s", "2"), cwd=ROOT, env=os.environ, stdout=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + 30
+    while not list((root / "snapshots").glob("*/.building")) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    b = subprocess.run(_writer(2), cwd=ROOT, env=os.environ, check=True, capture_output=True, text=True)
+    a_out, _ = a.communicate()
+
+    a_snap, b_snap = _snap_name(a_out), _snap_name(b.stdout)
+    print(f"[INFO] concurrent ingests: A wrote {a_snap}, B wrote {b_snap}")
+    if a_snap == b_snap:
+        failures.append("second ingest wrote into the running ingest's snapshot")
+    if "[SNAPSHOT] waiting" not in b.stdout:
+        failures.append("second ingest did not wait for the running one")
+    ids = _published_ids(root)
+    missing = [f"p{n}-0" for n in (0, 1, 2) if f"p{n}-0" not in ids]
+    if missing:
+        failures.append(f"published index lost updates: missing {missing}")
+
+    # A crashed ingest leaves an unlocked .building snapshot; the next run reuses it
+    c = subprocess.run(_writer(3, "--crash"), cwd=ROOT, env=os.environ, capture_output=True, text=True)
+    d = subprocess.run(_writer(4), cwd=ROOT, env=os.environ, check=True, capture_output=True, text=True)
+    print(f"[INFO] crashed ingest wrote {_snap_name(c.stdout)}, next ingest wrote {_snap_name(d.stdout)}")
+    if _snap_name(c.stdout) != _snap_name(d.stdout):
+        failures.append("crashed ingest's snapshot was not reused")
+    if not {"p3-0", "p4-0"} <= _published_ids(root):
+        failures.append("resumed snapshot is missing rows")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--publishes", type=int, default=5)
+    parser.add_argument("--publish", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--hold-s", type=float, default=0.0, help=argparse.SUPPRESS)
+    parser.add_argument("--crash", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.publish is not None:
+        _publish(args.publish, hold_s=args.hold_s, crash=args.crash)
+        return 0
+
+    os.environ.update(INDEX_BACKEND="chroma", EMBED_DIM=str(DIM), INDEX_SNAPSHOTS="1")
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHROMA_DIR"] = tmp
+        failures += check_client_eviction(args.publishes)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHROMA_DIR"] = tmp
+        failures += check_ingest_locking(Path(tmp))
+
+    for f in failures:
+        print(f"[FAIL] {f}")
+    if not failures:
+        print("[OK] snapshot swaps release old Chroma clients; concurrent ingests are serialized")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
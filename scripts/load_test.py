@@ -0,0 +1,241 @@
+"""
+Load test for the API with latency-SLO reporting.
+
+Drives /plan (and optionally /health) with a closed-loop concurrency sweep and
+a generated mix of TripRequests (destinations, trip lengths, interests). By
+default the app runs in-process, and --tool-latency-ms adds a stand-in
+provider wait per itinerary day to the endpoint's mock weather lookup,
+modelling the weather/events calls each day will make. Pass --url to test a
+running worker instead.
+
+    python scripts/load_test.py --concurrency 1 4 16 --requests 200
+    python scripts/load_test.py --tool-latency-ms 50 --slo-p95-ms 800 --json report.json
+    python scripts/load_test.py --url http://127.0.0.1:8000 --concurrency 8 32
+
+Exits 1 if any sweep level breaks an SLO.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_DESTINATIONS = ["Singapore", "Tokyo", "Paris", "Bangkok", "Lisbon", "Mexico City"]
+DEFAULT_INTERESTS = ["food", "museums", "nature", "nightlife", "shopping", "history", "architecture"]
+
+
+def _trip_request(rng: random.Random, args) -> dict:
+    days = rng.randint(args.min_days, args.max_days)
+    start = date.today() + timedelta(days=rng.randint(7, 90))
+    req = {
+        "destination": rng.choice(args.destinations),
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=days - 1)).isoformat(),
+        "pace": rng.choice(["slow", "medium", "fast"]),
+        "interests": rng.sample(DEFAULT_INTERESTS, rng.randint(0, 3)),
+    }
+    if rng.random() < 0.3:
+        req["budget"] = {"amount": rng.choice([500, 1500, 4000]), "currency": rng.choice(["USD", "SGD", "EUR"])}
+    return req
+
+
+def _percentile(sorted_ms: list, p: float) -> float:
+    # Nearest-rank: the smallest sample with at least p% of samples at or below it
+    if not sorted_ms:
+        return 0.0
+    k = max(0, min(len(sorted_ms) - 1, math.ceil(p / 100.0 * len(sorted_ms)) - 1))
+    return sorted_ms[k]
+
+
+def _install_stand_ins(tool_latency_s: float) -> None:
+    """
+    Adds stand-in provider latency to /plan: tool_latency_s per itinerary day,
+    slept in the endpoint's worker thread inside the mock weather lookup. The
+    wait is capped with timeout_for(), like a real provider call's timeout, and
+    a call cut short by the request deadline fails with DeadlineExceeded (504).
+    """
+    if tool_latency_s <= 0:
+        return
+
+    import app.api.routes as routes
+    from app.core.deadline import DeadlineExceeded, timeout_for
+
+    weather_for = routes._weather_for
+
+    def weather_with_latency(req):
+        wait_s = tool_latency_s * ((req.end_date - req.start_date).days + 1)
+        timeout_s = timeout_for(wait_s)
+        time.sleep(timeout_s)
+        if timeout_s < wait_s:
+            raise DeadlineExceeded("Deadline exceeded during weather lookup")
+        return weather_for(req)
+
+    routes._weather_for = weather_with_latency
+
+
+def _client(args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, timeout=args.timeout_s, limits=limits)
+
+    from app.main import app
+
+    _install_stand_ins(args.tool_latency_ms / 1000.0)
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout_s, limits=limits)
+
+
+async def _run_level(client, concurrency: int, args, rng: random.Random) -> dict:
+    samples = []  # (endpoint, days, status, ms)
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            if rng.random() < args.health_ratio:
+                endpoint, days, call = "/health", 0, client.get("/health")
+            else:
+                body = _trip_request(rng, args)
+                days = (date.fromisoformat(body["end_date"]) - date.fromisoformat(body["start_date"])).days + 1
+                headers = {}
+                if args.deadline_ms:
+                    headers["X-Deadline-Ms"] = str(args.deadline_ms)
+                endpoint, call = "/plan", client.post("/plan", json=body, headers=headers)
+
+            t0 = time.perf_counter()
+            try:
+                status = (await call).status_code
+            except Exception:
+                status = 0  # transport error / client timeout
+            samples.append((endpoint, days, status, (time.perf_counter() - t0) * 1000))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - t0
+    return _summarize(concurrency, samples, wall_s)
+
+
+def _summarize(concurrency: int, samples: list, wall_s: float) -> dict:
+    by_endpoint = defaultdict(list)
+    for s in samples:
+        by_endpoint[s[0]].append(s)
+
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        ok_ms = sorted(ms for _, _, status, ms in rows if 200 <= status < 300)
+        shed = sum(1 for r in rows if r[2] == 503)
+        timed_out = sum(1 for r in rows if r[2] == 504)
+        errors = sum(1 for r in rows if not 200 <= r[2] < 300)
+        entry = {
+            "requests": len(rows),
+            "ok": len(ok_ms),
+            "shed_503": shed,
+            "deadline_504": timed_out,
+            "error_rate": errors / len(rows),
+            "rps": len(ok_ms) / wall_s if wall_s > 0 else 0.0,
+            "p50_ms": _percentile(ok_ms, 50),
+            "p95_ms": _percentile(ok_ms, 95),
+            "p99_ms": _percentile(ok_ms, 99),
+            "max_ms": ok_ms[-1] if ok_ms else 0.0,
+        }
+        if endpoint == "/plan":
+            by_days = defaultdict(list)
+            for _, days, status, ms in rows:
+                if 200 <= status < 300:
+                    by_days[days].append(ms)
+            entry["p95_ms_by_days"] = {d: _percentile(sorted(v), 95) for d, v in sorted(by_days.items())}
+        endpoints[endpoint] = entry
+
+    return {"concurrency": concurrency, "wall_s": wall_s, "endpoints": endpoints}
+
+
+def _check_slos(level: dict, args) -> list:
+    plan = level["endpoints"].get("/plan")
+    if not plan:
+        return []
+    failures = []
+    if args.slo_p95_ms and plan["p95_ms"] > args.slo_p95_ms:
+        failures.append(f"p95 {plan['p95_ms']:.1f}ms > {args.slo_p95_ms}ms")
+    if args.slo_p99_ms and plan["p99_ms"] > args.slo_p99_ms:
+        failures.append(f"p99 {plan['p99_ms']:.1f}ms > {args.slo_p99_ms}ms")
+    if plan["error_rate"] > args.slo_error_rate:
+        failures.append(f"error rate {plan['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+    if args.slo_min_rps and plan["rps"] < args.slo_min_rps:
+        failures.append(f"throughput {plan['rps']:.1f} rps < {args.slo_min_rps} rps")
+    return failures
+
+
+def _print_level(level: dict, failures: list) -> None:
+    print(f"\n== concurrency {level['concurrency']}  ({level['wall_s']:.2f}s)")
+    print(f"  {'endpoint':<8} {'reqs':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err%':>6} {'503':>5} {'504':>5}")
+    for endpoint, e in level["endpoints"].items():
+        print(
+            f"  {endpoint:<8} {e['requests']:>6} {e['rps']:>8.1f} {e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} "
+            f"{e['p99_ms']:>8.1f} {e['max_ms']:>8.1f} {e['error_rate'] * 100:>6.1f} {e['shed_503']:>5} {e['deadline_504']:>5}"
+        )
+        if "p95_ms_by_days" in e:
+            by_days = "  ".join(f"{d}d={ms:.1f}" for d, ms in e["p95_ms_by_days"].items())
+            print(f"    /plan p95 by trip length: {by_days}")
+    print("  [FAIL] " + "; ".join(failures) if failures else "  [OK] SLOs met")
+
+
+async def _main(args) -> int:
+    rng = random.Random(args.seed)
+    report = {"config": {k: v for k, v in vars(args).items() if k != "json"}, "levels": []}
+    failed = False
+
+    async with _client(args) as client:
+        for c in args.concurrency:
+            level = await _run_level(client, c, args, rng)
+            failures = _check_slos(level, args)
+            level["slo_failures"] = failures
+            failed = failed or bool(failures)
+            report["levels"].append(level)
+            _print_level(level, failures)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.json}")
+
+    print("\n[FAIL] SLO check" if failed else "\n[OK] SLO check")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="Test a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--health-ratio", type=float, default=0.1, help="Fraction of requests sent to /health")
+    parser.add_argument("--destinations", nargs="+", default=DEFAULT_DESTINATIONS)
+    parser.add_argument("--min-days", type=int, default=1)
+    parser.add_argument("--max-days", type=int, default=7)
+    parser.add_argument("--tool-latency-ms", type=float, default=0.0, help="Stand-in provider latency per itinerary day")
+    parser.add_argument("--deadline-ms", type=int, default=None, help="Send X-Deadline-Ms with each /plan")
+    parser.add_argument("--timeout-s", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, default=None, help="Also write the full report as JSON")
+
+    # SLOs, checked against /plan at every concurrency level (0 = not checked)
+    parser.add_argument("--slo-p95-ms", type=float, default=1000.0)
+    parser.add_argument("--slo-p99-ms", type=float, default=2000.0)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-min-rps", type=float, default=0.0)
+
+    args = parser.parse_args()
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+"""
+Cold-start budget check for the API and the ingest CLI.
+
+Runs each entry point in a fresh interpreter with `-X importtime`, prints the
+slowest top-level imports, and fails if a heavy dependency was loaded eagerly
+or the wall time is over budget.
+
+    python scripts/test_startup.py [--top 15] [--api-budget-ms 2500] [--cli-budget-ms 800]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that must only load on first real use (retrieval, embedding, LLM calls)
+HEAVY = ["chromadb", "google.genai", "langchain", "langchain_google_genai", "numpy", "bs4", "lxml"]
+
+TARGETS = {
+    "api": ["-c", "import app.main"],
+    "cli": ["-m", "app.rag.ingest.run", "--help"],
+}
+
+
+def _probe_loaded(args: list[str]) -> list[str]:
+    # Re-run the target and report which heavy modules ended up in sys.modules
+    if args[0] == "-c":
+        code = args[1]
+    else:
+        code = f"import runpy, sys; sys.argv = {args[1:]!r}\ntry:\n    runpy.run_module({args[1]!r}, run_name='__main__')\nexcept SystemExit:\n    pass"
+    code += f"\nimport sys; print('LOADED=' + ','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    line = next(ln for ln in reversed(out.stdout.splitlines()) if ln.startswith("LOADED="))
+    return [m for m in line[len("LOADED="):].split(",") if m]
+
+
+def measure(args: list[str]) -> tuple[float, dict[str, int]]:
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if out.returncode != 0:
+        raise SystemExit(f"{' '.join(args)} failed:\n{out.stderr[-2000:]}")
+
+    # "import time: self [us] | cumulative | imported package"; sum self time per
+    # top-level package so the breakdown adds up to the total import time
+    by_pkg: dict[str, int] = defaultdict(int)
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        by_pkg[name.strip().split(".")[0]] += int(self_us)
+    return wall_ms, dict(by_pkg)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--api-budget-ms", type=float, default=2500)
+    parser.add_argument("--cli-budget-ms", type=float, default=800)
+    args = parser.parse_args()
+
+    budgets = {"api": args.api_budget_ms, "cli": args.cli_budget_ms}
+    failed = False
+
+    for name, target in TARGETS.items():
+        wall_ms, by_pkg = measure(target)
+        print(f"\n== {name}: {' '.join(target)}  wall={wall_ms:.0f} ms  budget={budgets[name]:.0f} ms")
+        for pkg, us in sorted(by_pkg.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+            print(f"  {us / 1000:8.1f} ms  {pkg}")
+
+        loaded = _probe_loaded(target)
+        if loaded:
+            print(f"[FAIL] {name}: heavy modules imported eagerly: {', '.join(loaded)}")
+            failed = True
+        if wall_ms > budgets[name]:
+            print(f"[FAIL] {name}: startup {wall_ms:.0f} ms over budget {budgets[name]:.0f} ms")
+            failed = True
+
+    print("\n[FAIL] startup budget" if failed else "\n[OK] startup budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())